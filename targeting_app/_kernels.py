@@ -0,0 +1,304 @@
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:  # optional; kernels fall back to NumPy ufuncs
+    njit = None
+
+# Every fast-math flag except nnan/ninf: masked pixels are NaN and must stay NaN
+FASTMATH_FLAGS = {"nsz", "arcp", "contract", "afn", "reassoc"}
+
+# Zero suitability is floored to the smallest normal float32 before taking logs, so a
+# geometric mean containing a zero comes out as ~0 rather than exp(-inf) warnings
+LOG_FLOOR = np.finfo(np.float32).tiny
+
+# The old '< 0' and '> 1' condition passes are a clamp, and clamping commutes with the
+# minimum: min(clip(a, 0, 1), clip(b, 0, 1)) == clip(min(a, b), 0, 1). Both versions
+# below therefore take the minimum of the raw ramps and clamp once.
+
+
+def _suitability_numpy(data, mn, of, ot, mx, out):
+    """NumPy version of suitability_kernel, used when numba is not installed."""
+    lower = np.empty_like(out)
+    if of != mn:
+        np.subtract(data, mn, out=lower)
+        np.divide(lower, of - mn, out=lower)
+    else:
+        lower.fill(1.0)
+        lower[np.isnan(data)] = np.nan
+    if mx != ot:
+        np.subtract(mx, data, out=out)
+        np.divide(out, mx - ot, out=out)
+        np.minimum(lower, out, out=out)
+    else:
+        np.copyto(out, lower)
+    np.clip(out, 0.0, 1.0, out=out)
+    return out
+
+
+def _trapezoid_numpy(data, nodata, mn, of, ot, mx, out):
+    """NumPy version of trapezoid_kernel."""
+    valid = data != nodata
+    out.fill(0.0)
+    out[valid & (data >= of) & (data <= ot)] = 1.0
+    if of > mn:
+        up = valid & (data > mn) & (data < of)
+        out[up] = (data[up] - mn) * (1.0 / (of - mn))
+    if mx > ot:
+        down = valid & (data > ot) & (data < mx)
+        out[down] = (mx - data[down]) * (1.0 / (mx - ot))
+    np.clip(out, 0.0, 1.0, out=out)
+    out[~valid] = nodata
+    return out
+
+
+def _classify_numpy(vals, valid, mins, maxs, lut, nodata_out, out):
+    """NumPy version of classify."""
+    valid = valid & (vals == vals)
+    v = vals[valid]
+    last = mins.size - 1
+    idx = np.searchsorted(mins, v, side="right") - 1
+    np.clip(idx, 0, last, out=idx)
+    hit = (v >= mins[idx]) & ((v < maxs[idx]) | ((idx == last) & (v <= maxs[idx])))
+    out.fill(nodata_out)
+    out[valid] = np.where(hit, lut[idx], np.array(nodata_out, dtype=out.dtype))
+    return out
+
+
+def _quantize_numpy(data, nodata, scale, out):
+    """NumPy version of quantize; rounds half up exactly as the numba version."""
+    np.copyto(out, np.floor(data * scale + 0.5), casting="unsafe")
+    out[data == nodata] = nodata
+    return out
+
+
+def _dequantize_numpy(data, nodata, inv_scale):
+    """NumPy version of dequantize."""
+    valid = data != nodata
+    data[valid] *= inv_scale
+    return data
+
+
+def _minmax_valid_numpy(data, nodata):
+    """NumPy version of minmax_valid."""
+    valid = data[(data != nodata) & (data == data)]
+    if not valid.size:
+        return np.inf, -np.inf, False
+    return float(valid.min()), float(valid.max()), True
+
+
+def _masked_maximum_numpy(acc, data, nodata):
+    """NumPy version of masked_maximum."""
+    missing = (acc == nodata) | (data == nodata)
+    # Take data only where it is strictly larger, so a NaN on either side keeps acc as the
+    # numba loop does (np.maximum would propagate it)
+    np.copyto(acc, data, where=data > acc)
+    acc[missing] = nodata
+    return acc
+
+
+def _masked_multiply_numpy(acc, data, nodata):
+    """NumPy version of masked_multiply."""
+    missing = (acc == nodata) | (data == nodata)
+    np.multiply(acc, data, out=acc)
+    acc[missing] = nodata
+    return acc
+
+
+def _add_log_numpy(data, acc):
+    """NumPy version of add_log; overwrites data."""
+    np.maximum(data, LOG_FLOOR, out=data)
+    np.log(data, out=data)
+    np.add(acc, data, out=acc)
+    return acc
+
+
+def _exp_mean_numpy(acc, inv_n, out):
+    """NumPy version of exp_mean."""
+    np.multiply(acc, inv_n, out=out)
+    np.exp(out, out=out)
+    return out
+
+
+if njit is not None:
+    @njit(parallel=True, fastmath=FASTMATH_FLAGS, cache=True, nogil=True)
+    def suitability_kernel(data, mn, of, ot, mx, out):
+        """Clamped min/max suitability ramps of a 2D block and their pixel-wise minimum."""
+        for i in prange(data.shape[0]):
+            for j in range(data.shape[1]):
+                x = data[i, j]
+                if x != x:
+                    out[i, j] = x
+                    continue
+                a = (x - mn) / (of - mn) if of != mn else 1.0
+                b = (mx - x) / (mx - ot) if mx != ot else 1.0
+                m = a if a < b else b
+                if m > 1.0:
+                    m = 1.0
+                elif m < 0.0:
+                    m = 0.0
+                out[i, j] = m
+        return out
+
+    @njit(parallel=True, fastmath=FASTMATH_FLAGS, cache=True, nogil=True)
+    def trapezoid_kernel(data, nodata, mn, of, ot, mx, out):
+        """Trapezoidal suitability of a 2D block: 1 on [of, ot], linear ramps on (mn, of) and
+        (ot, mx), 0 elsewhere; nodata pixels are passed through."""
+        # The ramp spans are loop invariants: divide once, multiply per pixel. A ramp is only
+        # taken when its span is positive, so the zero fallbacks are never used
+        inv_up = 1.0 / (of - mn) if of > mn else 0.0
+        inv_down = 1.0 / (mx - ot) if mx > ot else 0.0
+        for i in prange(data.shape[0]):
+            for j in range(data.shape[1]):
+                x = data[i, j]
+                if x == nodata:
+                    out[i, j] = nodata
+                    continue
+                if x >= of and x <= ot:
+                    s = 1.0
+                elif x > mn and x < of:
+                    s = (x - mn) * inv_up
+                elif x > ot and x < mx:
+                    s = (mx - x) * inv_down
+                else:
+                    s = 0.0
+                if s > 1.0:
+                    s = 1.0
+                elif s < 0.0:
+                    s = 0.0
+                out[i, j] = s
+        return out
+
+    @njit(parallel=True, cache=True, nogil=True)
+    def classify(vals, valid, mins, maxs, lut, nodata_out, out):
+        """Class lut[k] of each pixel of a 2D block under ordered, non-overlapping rules
+        [mins[k], maxs[k]) (the last one closed); invalid or NaN pixels and values outside
+        every rule get nodata_out."""
+        last = mins.size - 1
+        for i in prange(vals.shape[0]):
+            for j in range(vals.shape[1]):
+                v = vals[i, j]
+                c = nodata_out
+                if valid[i, j] and v == v:
+                    # Last rule whose min is <= v; rule tables are a handful of entries
+                    k = 0
+                    while k < last and v >= mins[k + 1]:
+                        k += 1
+                    if v >= mins[k] and (v < maxs[k] or (k == last and v <= maxs[k])):
+                        c = lut[k]
+                out[i, j] = c
+        return out
+
+    @njit(parallel=True, cache=True, nogil=True)
+    def quantize(data, nodata, scale, out):
+        """Non-negative scores scaled by scale and rounded into the integer block out; nodata
+        pixels are passed through."""
+        for i in prange(data.shape[0]):
+            for j in range(data.shape[1]):
+                x = data[i, j]
+                if x == nodata:
+                    out[i, j] = nodata
+                else:
+                    out[i, j] = int(np.floor(x * scale + 0.5))
+        return out
+
+    @njit(parallel=True, fastmath=FASTMATH_FLAGS, cache=True, nogil=True)
+    def dequantize(data, nodata, inv_scale):
+        """data *= inv_scale in place, skipping nodata pixels."""
+        for i in prange(data.shape[0]):
+            for j in range(data.shape[1]):
+                x = data[i, j]
+                if x != nodata:
+                    data[i, j] = x * inv_scale
+        return data
+
+    @njit(fastmath=FASTMATH_FLAGS, cache=True, nogil=True)
+    def minmax_valid(data, nodata):
+        """(min, max, any_valid) over the non-nodata, non-NaN pixels of a 2D block, in one pass."""
+        mn = np.inf
+        mx = -np.inf
+        found = False
+        for i in range(data.shape[0]):
+            for j in range(data.shape[1]):
+                x = data[i, j]
+                if x == nodata or x != x:
+                    continue
+                if x < mn:
+                    mn = x
+                if x > mx:
+                    mx = x
+                found = True
+        return mn, mx, found
+
+    @njit(parallel=True, cache=True, nogil=True)
+    def masked_maximum(acc, data, nodata):
+        """acc = max(acc, data) in place; nodata wherever either input is nodata."""
+        for i in prange(acc.shape[0]):
+            for j in range(acc.shape[1]):
+                a = acc[i, j]
+                b = data[i, j]
+                if a == nodata or b == nodata:
+                    acc[i, j] = nodata
+                elif b > a:
+                    acc[i, j] = b
+        return acc
+
+    @njit(parallel=True, cache=True, nogil=True)
+    def masked_multiply(acc, data, nodata):
+        """acc = acc * data in place; nodata wherever either input is nodata."""
+        for i in prange(acc.shape[0]):
+            for j in range(acc.shape[1]):
+                a = acc[i, j]
+                b = data[i, j]
+                if a == nodata or b == nodata:
+                    acc[i, j] = nodata
+                else:
+                    acc[i, j] = a * b
+        return acc
+
+    @njit(parallel=True, fastmath=FASTMATH_FLAGS, cache=True, nogil=True)
+    def add_log(data, acc):
+        """Add log(data) to the 2D accumulator acc, flooring data at LOG_FLOOR."""
+        for i in prange(data.shape[0]):
+            for j in range(data.shape[1]):
+                x = data[i, j]
+                if x < LOG_FLOOR:
+                    x = LOG_FLOOR
+                acc[i, j] += np.log(x)
+        return acc
+
+    @njit(parallel=True, fastmath=FASTMATH_FLAGS, cache=True, nogil=True)
+    def exp_mean(acc, inv_n, out):
+        """exp(acc * inv_n): the geometric mean of the values whose logs were summed in acc."""
+        for i in prange(acc.shape[0]):
+            for j in range(acc.shape[1]):
+                out[i, j] = np.exp(acc[i, j] * inv_n)
+        return out
+
+    # Compile (or load from the on-disk cache) the float32 specialisation at import rather
+    # than on the first request
+    _warm = np.zeros((1, 1), dtype=np.float32)
+    suitability_kernel(_warm, np.float32(0), np.float32(1), np.float32(2), np.float32(3), np.empty_like(_warm))
+    trapezoid_kernel(_warm, np.float32(-32768), np.float32(0), np.float32(1), np.float32(2), np.float32(3),
+                     np.empty_like(_warm))
+    classify(_warm, np.ones((1, 1), dtype=np.bool_), np.zeros(2, dtype=np.float32), np.ones(2, dtype=np.float32),
+             np.ones(2, dtype=np.uint8), 0, np.empty((1, 1), dtype=np.uint8))
+    quantize(_warm, np.float32(-32768), np.float32(10000), np.empty((1, 1), dtype=np.int16))
+    dequantize(np.zeros_like(_warm), np.float32(-32768), np.float32(1e-4))
+    minmax_valid(_warm, np.float32(-32768))
+    masked_maximum(np.zeros_like(_warm), _warm, np.float32(-32768))
+    masked_multiply(np.zeros_like(_warm), _warm, np.float32(-32768))
+    add_log(_warm, np.zeros_like(_warm))
+    exp_mean(_warm, np.float32(1), np.empty_like(_warm))
+    del _warm
+else:
+    suitability_kernel = _suitability_numpy
+    trapezoid_kernel = _trapezoid_numpy
+    minmax_valid = _minmax_valid_numpy
+    quantize = _quantize_numpy
+    classify = _classify_numpy
+    dequantize = _dequantize_numpy
+    masked_maximum = _masked_maximum_numpy
+    masked_multiply = _masked_multiply_numpy
+    add_log = _add_log_numpy
+    exp_mean = _exp_mean_numpy
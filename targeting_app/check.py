@@ -3,6 +3,10 @@ import numpy as np
 
 with rasterio.open('C:/Users/jchemutt/Documents/projects/Targeting/targeting_project/media/output/processing_20240919174650_fbf063a0330441b58eb3e7aa4cb4c629/MahalanobisDist.tif') as src:
     print(src.crs)
-    data = src.read(1)  # Read the first band
-    valid_data = data[np.isfinite(data)]  # Filter out NaN and invalid values
-    print("Valid values in raster:", valid_data)
\ No newline at end of file
+    valid_count = 0
+    total_count = 0
+    for _, window in src.block_windows(1):  # Stream the first band block by block
+        data = src.read(1, window=window)
+        valid_count += int(np.count_nonzero(np.isfinite(data)))  # Skip NaN and invalid values
+        total_count += data.size
+    print("Valid values in raster:", valid_count, "of", total_count)
@@ -1,34 +1,69 @@
 import os
 import json
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import rasterio
 
 def get_raster_min_max(raster_path):
+    # Stream the band block by block so large rasters never load whole
+    min_val, max_val = np.inf, -np.inf
     with rasterio.open(raster_path) as src:
-        data = src.read(1, masked=True)
-        min_val = data.min()
-        max_val = data.max()
+        nodata = src.nodata
+        for _, window in src.block_windows(1):
+            # Raw reads skip building a MaskedArray; NaN gaps are dropped with the nodata ones
+            data = src.read(1, window=window)
+            if nodata is not None:
+                data = data[data != nodata]
+            if np.issubdtype(data.dtype, np.floating):
+                data = data[~np.isnan(data)]
+            if data.size:
+                min_val = min(min_val, float(data.min()))
+                max_val = max(max_val, float(data.max()))
     return min_val, max_val
 
+def get_raster_min_max_named(file_path):
+    min_val, max_val = get_raster_min_max(file_path)
+    return os.path.basename(file_path), min_val, max_val
+
+def iter_tif_paths(input_folder):
+    # scandir hands back file types from the directory listing, so no per-file stat or join
+    stack = [input_folder]
+    while stack:
+        subdirs = []
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.name.endswith('.tif'):
+                    yield entry.path
+        # A directory's files come before its subdirectories, which are pushed reversed so they
+        # pop in listing order: the same top-down order as os.walk, so values.json keeps its order
+        stack.extend(reversed(subdirs))
+
+def json_number(val):
+    # A raster with no valid pixel keeps the inf/-inf seeds, which are not valid JSON
+    if not np.isfinite(val):
+        return None
+    return int(val) if val.is_integer() else float(val)
+
 def process_raster_files(input_folder, output_json):
     raster_info_list = []
-    
-    for root, _, files in os.walk(input_folder):
-        for file in files:
-            if file.endswith('.tif'):
-                file_path = os.path.join(root, file)
-                min_val, max_val = get_raster_min_max(file_path)
-                raster_info = {
-                        'name': file,
-                        'min_val': int(min_val) if min_val.is_integer() else float(min_val),
-                        'max_val': int(max_val) if max_val.is_integer() else float(max_val)
-                    }
-                raster_info_list.append(raster_info)
-                print(raster_info)
-    
- 
-    
+
+    file_paths = list(iter_tif_paths(input_folder))
+
+    # Each raster is independent, so decode them on all cores
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        for name, min_val, max_val in executor.map(get_raster_min_max_named, file_paths):
+            raster_info = {
+                    'name': name,
+                    'min_val': json_number(min_val),
+                    'max_val': json_number(max_val)
+                }
+            raster_info_list.append(raster_info)
+            print(raster_info)
+
     with open(output_json, 'w') as json_file:
-        json.dump(raster_info_list, json_file, indent=4)
+        json.dump(raster_info_list, json_file, indent=4, allow_nan=False)
 
 if __name__ == "__main__":
     input_folder = 'C:/Users/jchemutt/Documents/projects/Targeting/targeting_project/data'
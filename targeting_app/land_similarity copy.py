@@ -6,11 +6,11 @@ from collections import OrderedDict
 import numpy as np
 import pandas as pd
 import rasterio
-from rasterio.mask import mask
-from dbfread import DBF
+from rasterio.features import bounds as feature_bounds, geometry_mask
+from rasterio.windows import Window, from_bounds
 import geopandas as gpd
+import shapely
 from osgeo import gdal
-import csv
 import re
 
 from .similarity_analysis import similarity_analysis
@@ -18,6 +18,10 @@ from .similarity_analysis import similarity_analysis
 # Ensure GDAL_DATA environment variable is set correctly
 os.environ['GDAL_DATA'] = os.environ['CONDA_PREFIX'] + r'\Library\share\gdal'
 print(f"GDAL_DATA is set to: {os.environ.get('GDAL_DATA')}")
+gdal.SetConfigOption('GDAL_CACHEMAX', '25%')
+
+# Above this many window pixels per sample point, per-point reads beat decoding the window
+SPARSE_SAMPLE_PIXELS = 512 * 512
 
 class LandSimilarity:
     def __init__(self, parameters):
@@ -64,26 +68,19 @@ class LandSimilarity:
         return
 
     def get_min_cell_size(self, images):
-        ras_cell_size = {}
-        extent_array = []
-
+        # Open each raster once and keep (path, cell size, extent) for both passes
+        raster_infos = []
         for img in images:
             if isinstance(img, list):
                 img = img[0]
             img = img.replace("'", "").strip()
             with rasterio.open(img) as src:
-                cellsize = src.res[0]
-                ras_cell_size[img] = cellsize
                 extent = src.bounds
-                extent_ls = [extent.left, extent.bottom, extent.right, extent.top]
-                extent_array.append(extent_ls)
+                raster_infos.append((img, src.res[0], [extent.left, extent.bottom, extent.right, extent.top]))
 
-        min_extent = list(np.amin(np.array(extent_array), axis=0))
-        min_size = min(ras_cell_size.values())
-        source_cell_ras = None
-        source_ext_ras = None
-        diff_cell_raster = []
-        diff_ext_raster = []
+        lefts, bottoms, rights, tops = zip(*(info[2] for info in raster_infos))
+        min_extent = [min(lefts), min(bottoms), min(rights), min(tops)]
+        min_size = min(info[1] for info in raster_infos)
 
         output = {
             'diff_cell_raster': [],
@@ -94,23 +91,16 @@ class LandSimilarity:
             'min_size': min_size
         }
 
-        for img in images:
-            if isinstance(img, list):
-                img = img[0]
-            img = img.replace("'", "").strip()
-            with rasterio.open(img) as src:
-                cellsize = src.res[0]
-                extent = src.bounds
-                extent_ls = [extent.left, extent.bottom, extent.right, extent.top]
-                if extent_ls != min_extent:
-                    output['diff_ext_raster'].append(img)
-                else:
-                    output['source_ext_ras'] = img
+        for img, cellsize, extent_ls in raster_infos:
+            if extent_ls != min_extent:
+                output['diff_ext_raster'].append(img)
+            else:
+                output['source_ext_ras'] = img
 
-                if min_size != cellsize:
-                    output['diff_cell_raster'].append(img)
-                else:
-                    output['source_cell_ras'] = img
+            if min_size != cellsize:
+                output['diff_cell_raster'].append(img)
+            else:
+                output['source_cell_ras'] = img
 
         return output
 
@@ -121,30 +111,51 @@ class LandSimilarity:
                 raster = raster[0]
             raster = raster.replace("'", "").strip()
 
-            clip_name = f'clip_{os.path.basename(raster)}'
             res_name = f'res_{os.path.basename(raster)}'
-
-            clip_raster = os.path.join(processing_path, clip_name)
             res_raster = os.path.join(processing_path, res_name)
 
-            with rasterio.open(raster) as src:
-                out_image, out_transform = mask(src, [infos['min_extent']], crop=True)
-                out_meta = src.meta.copy()
-                out_meta.update({"driver": "GTiff",
-                                 "height": out_image.shape[1],
-                                 "width": out_image.shape[2],
-                                 "transform": out_transform})
-                with rasterio.open(clip_raster, "w", **out_meta) as dest:
-                    dest.write(out_image)
-
-            gdal.Warp(res_raster, clip_raster, xRes=infos['min_size'], yRes=infos['min_size'], resampleAlg='nearest')
+            # Clip and resample in a single warp; no intermediate clip raster hits disk
+            gdal.Warp(res_raster, raster, outputBounds=infos['min_extent'],
+                      xRes=infos['min_size'], yRes=infos['min_size'], resampleAlg='nearest',
+                      multithread=True, warpOptions=['NUM_THREADS=ALL_CPUS'],
+                      creationOptions=['TILED=YES', 'BLOCKXSIZE=512', 'BLOCKYSIZE=512',
+                                       'COMPRESS=DEFLATE', 'PREDICTOR=2', 'NUM_THREADS=ALL_CPUS'])
 
             processed_raster.append(res_raster)
         return processed_raster
 
+    def clip_raster_to_extent(self, in_raster, extent, out_raster):
+        # Stream the crop block by block so the clipped raster is never held in memory whole
+        with rasterio.open(in_raster) as src:
+            win = from_bounds(*feature_bounds(extent), transform=src.transform)
+            win = win.round_offsets().round_lengths().intersection(Window(0, 0, src.width, src.height))
+            fill = src.nodata if src.nodata is not None else 0
+            profile = src.profile.copy()
+            profile.update({"driver": "GTiff",
+                            "height": win.height,
+                            "width": win.width,
+                            "transform": src.window_transform(win),
+                            "tiled": True,
+                            "blockxsize": 512,
+                            "blockysize": 512,
+                            "compress": "deflate",
+                            "predictor": 2,
+                            "num_threads": "all_cpus"})
+            with rasterio.open(out_raster, "w", **profile) as dest:
+                for _, block in dest.block_windows(1):
+                    src_win = Window(win.col_off + block.col_off, win.row_off + block.row_off,
+                                     block.width, block.height)
+                    data = src.read(window=src_win)
+                    outside = geometry_mask([extent], out_shape=(block.height, block.width),
+                                            transform=src.window_transform(src_win))
+                    data[:, outside] = fill
+                    dest.write(data, window=block)
+
     def reproject_points(self, points_gdf, target_crs):
-        points_gdf = points_gdf.to_crs(epsg=4326)  # Assuming input points are in WGS84
-        points_gdf = points_gdf.to_crs(target_crs)
+        if points_gdf.crs is None:
+            points_gdf = points_gdf.set_crs(epsg=4326)  # Assuming input points are in WGS84
+        if points_gdf.crs != target_crs:
+            points_gdf = points_gdf.to_crs(target_crs)
         return points_gdf
 
     def execute(self):
@@ -160,7 +171,6 @@ class LandSimilarity:
         json_file = os.path.join(self.ras_temp_path, 'in_point.json')
         with open(json_file, 'w') as the_file:
             the_file.write(json.dumps(self.parameters['in_point'], indent=4))
-        in_fc_pt = os.path.join(self.ras_temp_path, "in_point.shp")
 
         gdf = gpd.read_file(json_file)
 
@@ -180,8 +190,6 @@ class LandSimilarity:
             print(f"Raster CRS: {raster_crs}")
             gdf = self.reproject_points(gdf, raster_crs)
 
-        gdf.to_file(in_fc_pt)
-
         if 'out_extent' in self.parameters.keys():
             if not isinstance(self.parameters['out_extent'], OrderedDict):
                 in_fc = self.parameters['out_extent']
@@ -197,19 +205,21 @@ class LandSimilarity:
             in_fc = None
 
         try:
-            self.createValueSample(self.parameters, in_fc_pt, self.ras_temp_path, in_fc, extent=None)
+            self.createValueSample(self.parameters, gdf, self.ras_temp_path, in_fc, extent=None)
         except Exception as e:
             print(f"Error creating value sample: {e}")
             return None, None
 
         try:
-            similarity_analysis(self.get_value_table_count(self.parameters), self.ras_temp_path)
+            # similarity_analysis reads the GeoTIFFs directly; no ASCII grids needed
+            file_paths = [paths[0] for paths in value_table]
+            similarity_analysis(self.get_value_table_count(self.parameters), self.ras_temp_path, file_paths)
         except Exception as e:
             print(f"Error in similarity_analysis: {e}")
             return None, None
 
-        mnobis_file = os.path.join(self.ras_temp_path, 'MahalanobisDist.asc')
-        mess_file = os.path.join(self.ras_temp_path, 'MESS.asc')
+        mnobis_file = os.path.join(self.ras_temp_path, 'MahalanobisDist.tif')
+        mess_file = os.path.join(self.ras_temp_path, 'MESS.tif')
         workspace_path = os.getcwd().replace("\\", "/")
         media_dir = os.path.join(workspace_path, "media")
 
@@ -232,12 +242,9 @@ class LandSimilarity:
         return result_relative_mnobis_ras_url, result_relative_mess_ras_url
 
     def write_csv_from_dbf(self, in_dbf, out_csv):
-        with open(out_csv, 'w', newline='') as csvf:
-            db = DBF(in_dbf)
-            writer = csv.writer(csvf)
-            writer.writerow(db.field_names)
-            for record in db:
-                writer.writerow(list(record.values()))
+        # Read the attribute table in one columnar pass instead of record by record
+        table = gpd.read_file(in_dbf, ignore_geometry=True)
+        table.to_csv(out_csv, index=False)
         print("Finished writing to CSV")
         print("Checking if temp.csv exists and its content:")
         if os.path.exists(out_csv):
@@ -245,7 +252,7 @@ class LandSimilarity:
             with open(out_csv, 'r') as f:
                 print(f.read())
 
-    def createValueSample(self, parameters, in_fc_pt, ras_temp_path, in_fc, extent):
+    def createValueSample(self, parameters, points_gdf, ras_temp_path, in_fc, extent):
         in_val_raster = list(self.prepare_value_table(parameters))
         num_rows = self.get_value_table_count(parameters)
         first_in_raster = in_val_raster[0][0] if num_rows > 0 else None
@@ -270,76 +277,63 @@ class LandSimilarity:
             if extent is not None:
                 try:
                     clip_raster = os.path.join(ras_temp_path, f"mask_{i}.tif")
-                    with rasterio.open(in_ras_file) as src:
-                        out_image, out_transform = mask(src, [extent], crop=True)
-                        out_meta = src.meta.copy()
-                        out_meta.update({"driver": "GTiff",
-                                         "height": out_image.shape[1],
-                                         "width": out_image.shape[2],
-                                         "transform": out_transform})
-                        with rasterio.open(clip_raster, "w", **out_meta) as dest:
-                            dest.write(out_image)
-                    sample_ras = self.convertRasterToASCII(num_rows, ras_temp_path, i, clip_raster, clip_raster)
-                    sample_in_ras.append(sample_ras)
+                    self.clip_raster_to_extent(in_ras_file, extent, clip_raster)
+                    sample_in_ras.append(clip_raster)
                 except Exception as ex:
                     print(f"Error clipping raster: {ex}")
-                    sample_ras = self.convertRasterToASCII(num_rows, ras_temp_path, i, in_ras_file, in_ras_file)
-                    sample_in_ras.append(sample_ras)
+                    sample_in_ras.append(in_ras_file)
             else:
-                sample_ras = self.convertRasterToASCII(num_rows, ras_temp_path, i, in_ras_file, in_ras_file)
-                sample_in_ras.append(sample_ras)
+                sample_in_ras.append(in_ras_file)
 
         sample_output = os.path.join(ras_temp_path, "temp.dbf")
-        self.sample_rasters(sample_in_ras, in_fc_pt, sample_output)
+        self.sample_rasters(sample_in_ras, points_gdf, sample_output)
 
         # Write the DBF to CSV
         sample_output_csv = os.path.join(ras_temp_path, "temp.csv")
         self.write_csv_from_dbf(sample_output, sample_output_csv)
 
-    def convertRasterToASCII(self, num_rows, ras_temp_path, i, first_in_raster, in_raster):
-        output_ascii_path = os.path.join(ras_temp_path, f"tempAscii_{i}.asc")
-        
-        translate_options = gdal.TranslateOptions(format="AAIGrid", creationOptions=["FORCE_CELLSIZE=TRUE"])
-        
-        try:
-            if num_rows > 1:
-                if i == 1:
-                    sample_ras = first_in_raster
-                    gdal.Translate(output_ascii_path, first_in_raster, options=translate_options)
-                else:
-                    sample_ras = in_raster
-                    gdal.Translate(output_ascii_path, sample_ras, options=translate_options)
-            else:
-                sample_ras = in_raster
-                gdal.Translate(output_ascii_path, in_raster, options=translate_options)
-            
-            print(f"Successfully converted raster to ASCII: {output_ascii_path}")
-            return sample_ras
-        except Exception as e:
-            print(f"Error converting raster to ASCII: {e}")
-            raise
-
-    def sample_rasters(self, rasters, points, output):
+    def sample_rasters(self, rasters, points_gdf, output):
+        # points_gdf is the reprojected GeoDataFrame from execute; no shapefile round-trip
         sampled_data = []
         sampled_points = []
-        points_gdf = gpd.read_file(points)
+        # Pull all point coordinates out in one vectorized GEOS call
+        coords = shapely.get_coordinates(points_gdf.geometry.to_numpy())
+        xs, ys = coords[:, 0], coords[:, 1]
         # Get the CRS from the first raster
         with rasterio.open(rasters[0]) as src:
             raster_crs = src.crs
+        buf = None
         for raster_path in rasters:
             print(f"Processing raster: {raster_path}")
             with rasterio.open(raster_path) as src:
-                for point in points_gdf.geometry:
-                    print(f"Processing geometry: {point}")
-                    try:
-                        row, col = src.index(point.x, point.y)
-                        sample_value = src.read(1)[row, col]
-                        print(f"Sample value: {sample_value}")
-                        sampled_data.append(sample_value)
-                        sampled_points.append(point)
-                    except IndexError:
-                        print("Error sampling geometry: Input shapes do not overlap raster.")
-                        sampled_data.append(np.nan)
+                h, w = src.height, src.width
+                # Map every point to pixel space with one inverse-affine call
+                cols_f, rows_f = ~src.transform * (xs, ys)
+                rows = np.floor(rows_f).astype(np.intp)
+                cols = np.floor(cols_f).astype(np.intp)
+                # Points outside the raster (or on NoData) are recorded as NaN
+                valid = (rows >= 0) & (rows < h) & (cols >= 0) & (cols < w)
+                values = np.full(rows.shape, np.nan)
+                if valid.any():
+                    # Only decode the window spanning the points, not the whole band
+                    row_off, col_off = rows[valid].min(), cols[valid].min()
+                    window = Window(col_off, row_off, cols[valid].max() - col_off + 1, rows[valid].max() - row_off + 1)
+                    if window.width * window.height > np.count_nonzero(valid) * SPARSE_SAMPLE_PIXELS:
+                        # Few points spread over a large span: let GDAL read just the pixel under each point
+                        samples = src.sample(zip(xs[valid], ys[valid]), indexes=1, masked=True)
+                        values[valid] = [np.nan if np.ma.is_masked(v) else v[0] for v in samples]
+                    else:
+                        # Equalized rasters share a window shape, so reuse one read buffer across them
+                        shape = (int(window.height), int(window.width))
+                        if buf is None or buf.shape != shape or buf.dtype != np.dtype(src.dtypes[0]):
+                            buf = np.empty(shape, dtype=src.dtypes[0])
+                        src.read(1, window=window, out=buf)
+                        hits = buf[rows[valid] - row_off, cols[valid] - col_off].astype(np.float64)
+                        if src.nodata is not None:
+                            hits[hits == src.nodata] = np.nan
+                        values[valid] = hits
+                sampled_data.extend(values)
+                sampled_points.extend(points_gdf.geometry)
 
         if sampled_data:
             sample_df = pd.DataFrame(sampled_data, columns=['values'])
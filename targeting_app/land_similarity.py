@@ -7,8 +7,10 @@ import numpy as np
 import pandas as pd
 import rasterio
 from rasterio.mask import mask
+from rasterio.windows import Window
 from dbfread import DBF
 import geopandas as gpd
+import shapely
 import csv
 import re
 from osgeo import gdal
@@ -18,6 +20,10 @@ from .similarity_analysis import similarity_analysis
 # Ensure GDAL_DATA environment variable is set correctly
 os.environ['GDAL_DATA'] = os.environ['CONDA_PREFIX'] + r'\Library\share\gdal'
 print(f"GDAL_DATA is set to: {os.environ.get('GDAL_DATA')}")
+gdal.SetConfigOption('GDAL_CACHEMAX', '25%')
+
+# Above this many window pixels per sample point, per-point reads beat decoding the window
+SPARSE_SAMPLE_PIXELS = 512 * 512
 
 class LandSimilarity:
     def __init__(self, parameters):
@@ -116,30 +122,24 @@ class LandSimilarity:
                 raster = raster[0]
             raster = raster.replace("'", "").strip()
 
-            clip_name = f'clip_{os.path.basename(raster)}'
             res_name = f'res_{os.path.basename(raster)}'
-
-            clip_raster = os.path.join(processing_path, clip_name)
             res_raster = os.path.join(processing_path, res_name)
 
-            with rasterio.open(raster) as src:
-                out_image, out_transform = mask(src, [infos['min_extent']], crop=True)
-                out_meta = src.meta.copy()
-                out_meta.update({"driver": "GTiff",
-                                 "height": out_image.shape[1],
-                                 "width": out_image.shape[2],
-                                 "transform": out_transform})
-                with rasterio.open(clip_raster, "w", **out_meta) as dest:
-                    dest.write(out_image)
-
-            gdal.Warp(res_raster, clip_raster, xRes=infos['min_size'], yRes=infos['min_size'], resampleAlg='nearest')
+            # Clip and resample in a single warp; no intermediate clip raster hits disk
+            gdal.Warp(res_raster, raster, outputBounds=infos['min_extent'],
+                      xRes=infos['min_size'], yRes=infos['min_size'], resampleAlg='nearest',
+                      multithread=True, warpOptions=['NUM_THREADS=ALL_CPUS'],
+                      creationOptions=['TILED=YES', 'BLOCKXSIZE=512', 'BLOCKYSIZE=512',
+                                       'COMPRESS=DEFLATE', 'PREDICTOR=2', 'NUM_THREADS=ALL_CPUS'])
 
             processed_raster.append(res_raster)
         return processed_raster
 
     def reproject_points(self, points_gdf, target_crs):
-        points_gdf = points_gdf.to_crs(epsg=4326)  # Assuming input points are in WGS84
-        points_gdf = points_gdf.to_crs(target_crs)
+        if points_gdf.crs is None:
+            points_gdf = points_gdf.set_crs(epsg=4326)  # Assuming input points are in WGS84
+        if points_gdf.crs != target_crs:
+            points_gdf = points_gdf.to_crs(target_crs)
         return points_gdf
 
     def execute(self):
@@ -152,11 +152,10 @@ class LandSimilarity:
         if not os.path.exists(self.ras_temp_path):
             os.makedirs(self.ras_temp_path)
 
-        # Save the input points as a shapefile (in_fc_pt)
+        # Save the input points as GeoJSON to load them
         json_file = os.path.join(self.ras_temp_path, 'in_point.json')
         with open(json_file, 'w') as the_file:
             the_file.write(json.dumps(self.parameters['in_point'], indent=4))
-        in_fc_pt = os.path.join(self.ras_temp_path, "in_point.shp")
 
         # Load input GeoDataFrame from the JSON file
         gdf = gpd.read_file(json_file)
@@ -179,9 +178,6 @@ class LandSimilarity:
             print(f"Raster CRS: {raster_crs}")
             gdf = self.reproject_points(gdf, raster_crs)
 
-        # Save the reprojected points as a shapefile
-        gdf.to_file(in_fc_pt)
-
         # Handle optional extent for clipping
         if 'out_extent' in self.parameters.keys():
             if not isinstance(self.parameters['out_extent'], OrderedDict):
@@ -199,7 +195,7 @@ class LandSimilarity:
 
         # Create value samples
         try:
-            self.createValueSample(self.parameters, in_fc_pt, self.ras_temp_path, in_fc, extent=None)
+            self.createValueSample(self.parameters, gdf, self.ras_temp_path, in_fc, extent=None)
         except Exception as e:
             print(f"Error creating value sample: {e}")
             return None, None
@@ -255,7 +251,7 @@ class LandSimilarity:
             with open(out_csv, 'r') as f:
                 print(f.read())
 
-    def createValueSample(self, parameters, in_fc_pt, ras_temp_path, in_fc, extent):
+    def createValueSample(self, parameters, points_gdf, ras_temp_path, in_fc, extent):
         in_val_raster = list(self.prepare_value_table(parameters))
         num_rows = self.get_value_table_count(parameters)
         first_in_raster = in_val_raster[0][0] if num_rows > 0 else None
@@ -297,33 +293,59 @@ class LandSimilarity:
                 sample_in_ras.append(in_ras_file)
 
         sample_output = os.path.join(ras_temp_path, "temp.dbf")
-        self.sample_rasters(sample_in_ras, in_fc_pt, sample_output)
+        self.sample_rasters(sample_in_ras, points_gdf, sample_output)
 
         # Write the DBF to CSV
         sample_output_csv = os.path.join(ras_temp_path, "temp.csv")
         self.write_csv_from_dbf(sample_output, sample_output_csv)
 
-    def sample_rasters(self, rasters, points, output):
+    def sample_rasters(self, rasters, points_gdf, output):
+        # points_gdf is the reprojected GeoDataFrame from execute; no shapefile round-trip
         sampled_data = []
         sampled_points = []
-        points_gdf = gpd.read_file(points)
+        # Pull all point coordinates out in one vectorized GEOS call
+        coords = shapely.get_coordinates(points_gdf.geometry.to_numpy())
+        xs, ys = coords[:, 0], coords[:, 1]
         # Get the CRS from the first raster
         with rasterio.open(rasters[0]) as src:
             raster_crs = src.crs
+        buf = None
         for raster_path in rasters:
             print(f"Processing raster: {raster_path}")
             with rasterio.open(raster_path) as src:
-                for point in points_gdf.geometry:
-                    print(f"Processing geometry: {point}")
-                    try:
-                        row, col = src.index(point.x, point.y)
-                        sample_value = src.read(1)[row, col]
-                        print(f"Sample value: {sample_value}")
-                        sampled_data.append(sample_value)
-                        sampled_points.append(point)
-                    except IndexError:
-                        print("Error sampling geometry: Input shapes do not overlap raster.")
-                        sampled_data.append(np.nan)
+                h, w = src.height, src.width
+                # Map every point to pixel space with one inverse-affine call
+                cols_f, rows_f = ~src.transform * (xs, ys)
+                rows = np.floor(rows_f).astype(np.intp)
+                cols = np.floor(cols_f).astype(np.intp)
+                # Points outside the raster (or on NoData) are recorded as NaN
+                valid = (rows >= 0) & (rows < h) & (cols >= 0) & (cols < w)
+                values = np.full(rows.shape, np.nan)
+                if valid.any():
+                    # Only decode the window spanning the points, not the whole band
+                    row_off, col_off = rows[valid].min(), cols[valid].min()
+                    window = Window(col_off, row_off, cols[valid].max() - col_off + 1, rows[valid].max() - row_off + 1)
+                    if window.width * window.height > np.count_nonzero(valid) * SPARSE_SAMPLE_PIXELS:
+                        # Few points spread over a large span: let GDAL read just the pixel under each point
+                        samples = src.sample(zip(xs[valid], ys[valid]), indexes=1, masked=True)
+                        values[valid] = [np.nan if np.ma.is_masked(v) else v[0] for v in samples]
+                    else:
+                        # Equalized rasters share a window shape, so reuse one read buffer across them
+                        shape = (int(window.height), int(window.width))
+                        if buf is None or buf.shape != shape or buf.dtype != np.dtype(src.dtypes[0]):
+                            buf = np.empty(shape, dtype=src.dtypes[0])
+                        src.read(1, window=window, out=buf)
+                        hits = buf[rows[valid] - row_off, cols[valid] - col_off].astype(np.float64)
+                        if src.nodata is not None:
+                            hits[hits == src.nodata] = np.nan
+                        values[valid] = hits
+                sampled_data.extend(values)
+                # Every point keeps its row, so values and geometries stay aligned
+                sampled_points.extend(points_gdf.geometry)
+            # Report once per raster rather than once per point
+            missed = np.count_nonzero(~valid)
+            if missed:
+                print(f"Error sampling {missed} geometries: Input shapes do not overlap raster.")
 
         if sampled_data:
             sample_df = pd.DataFrame(sampled_data, columns=['values'])
@@ -7,9 +7,9 @@ import numpy as np
 import pandas as pd
 import rasterio
 from rasterio.mask import mask
-from dbfread import DBF
+from rasterio.windows import Window
 import geopandas as gpd
-import csv
+import shapely
 import re
 import shutil
 #from osgeo import gdal
@@ -22,6 +22,9 @@ from .similarity_analysis3 import similarity_analysis
 #os.environ['GDAL_DATA'] = os.environ['CONDA_PREFIX'] + r'\Library\share\gdal'
 #print(f"GDAL_DATA is set to: {os.environ.get('GDAL_DATA')}")
 
+# Above this many window pixels per sample point, per-point reads beat decoding the window
+SPARSE_SAMPLE_PIXELS = 512 * 512
+
 class LandSimilarity:
     def __init__(self, parameters,session):
         self.label = "Land Similarity"
@@ -64,41 +67,65 @@ class LandSimilarity:
         """
         Reproject a GeoDataFrame to a target CRS.
         """
+        if points_gdf.crs is None:
+            points_gdf = points_gdf.set_crs(epsg=4326)  # Assuming input points are in WGS84
+        if points_gdf.crs == target_crs:
+            return points_gdf
         print(f"Reprojecting points to CRS: {target_crs}")
         points_gdf = points_gdf.to_crs(target_crs)
         return points_gdf
 
 
-    def sample_rasters(self, rasters, points_path, output_path):
+    def sample_rasters(self, rasters, points_gdf, output_path):
         """
-        Sample raster values at point locations and save as a shapefile.
+        Sample raster values at the points of a GeoDataFrame and save as a shapefile.
         """
         print(f"Sampling rasters from: {rasters}")
-        print(f"Using points from: {points_path}")
         print(f"Output path: {output_path}")
 
         sampled_data = []
-        points_gdf = gpd.read_file(points_path)
-        print(f"Loaded points GeoDataFrame: {points_gdf.head()}")
+        print(f"Using points GeoDataFrame: {points_gdf.head()}")
+        # Pull all point coordinates out in one vectorized GEOS call
+        coords = shapely.get_coordinates(points_gdf.geometry.to_numpy())
+        xs, ys = coords[:, 0], coords[:, 1]
 
         # Initialize sampled points list
         sampled_points = []
 
         # Sample raster values at the points
+        buf = None
         for raster_path in rasters:
             try:
                 with rasterio.open(raster_path) as src:
                     print(f"Processing raster: {raster_path}")
-                    for point in points_gdf.geometry:
-                        try:
-                            row, col = src.index(point.x, point.y)
-                            sample_value = src.read(1)[row, col]
-                            sampled_data.append(sample_value)
-                            sampled_points.append(point)  # geometry for this sample
-                        except IndexError:
-                            print(f"Point {point} is outside raster bounds.")
-                            sampled_data.append(np.nan)
-                            sampled_points.append(point)  # <-- add this line
+                    h, w = src.height, src.width
+                    # Map every point to pixel space with one inverse-affine call
+                    cols_f, rows_f = ~src.transform * (xs, ys)
+                    rows = np.floor(rows_f).astype(np.intp)
+                    cols = np.floor(cols_f).astype(np.intp)
+                    # Points outside the raster (or on NoData) are recorded as NaN
+                    valid = (rows >= 0) & (rows < h) & (cols >= 0) & (cols < w)
+                    values = np.full(rows.shape, np.nan)
+                    if valid.any():
+                        # Only decode the window spanning the points, not the whole band
+                        row_off, col_off = rows[valid].min(), cols[valid].min()
+                        window = Window(col_off, row_off, cols[valid].max() - col_off + 1, rows[valid].max() - row_off + 1)
+                        if window.width * window.height > np.count_nonzero(valid) * SPARSE_SAMPLE_PIXELS:
+                            # Few points spread over a large span: let GDAL read just the pixel under each point
+                            samples = src.sample(zip(xs[valid], ys[valid]), indexes=1, masked=True)
+                            values[valid] = [np.nan if np.ma.is_masked(v) else v[0] for v in samples]
+                        else:
+                            # Equalized rasters share a window shape, so reuse one read buffer across them
+                            shape = (int(window.height), int(window.width))
+                            if buf is None or buf.shape != shape or buf.dtype != np.dtype(src.dtypes[0]):
+                                buf = np.empty(shape, dtype=src.dtypes[0])
+                            src.read(1, window=window, out=buf)
+                            hits = buf[rows[valid] - row_off, cols[valid] - col_off].astype(np.float64)
+                            if src.nodata is not None:
+                                hits[hits == src.nodata] = np.nan
+                            values[valid] = hits
+                    sampled_data.extend(values)
+                    sampled_points.extend(points_gdf.geometry)
             except Exception as e:
                 print(f"Error processing raster {raster_path}: {e}")
 
@@ -119,12 +146,9 @@ class LandSimilarity:
         """
 
         try:
-            with open(csv_path, 'w', newline='') as csv_file:
-                db = DBF(dbf_path)
-                writer = csv.writer(csv_file)
-                writer.writerow(db.field_names)  # Write headers
-                for record in db:
-                    writer.writerow(list(record.values()))  # Write each record
+            # Read the attribute table in one columnar pass instead of record by record
+            table = gpd.read_file(dbf_path, ignore_geometry=True)
+            table.to_csv(csv_path, index=False)
         except Exception as e:
             print(f"Error converting DBF to CSV: {e}")
             raise
@@ -164,17 +188,14 @@ class LandSimilarity:
             else:
                 print("No raster files found for similarity analysis.")
             gdf = gpd.read_file(json.dumps(self.parameters.get('in_point')))
-            raster_crs = rasterio.open(rasters[0]).crs
+            with rasterio.open(rasters[0]) as src:
+                raster_crs = src.crs
             print(f"Raster CRS: {raster_crs}")
             gdf = self.reproject_points(gdf, raster_crs)
 
-            in_fc_pt = os.path.join(self.ras_temp_path, "input_points.shp")
-            print(f"Saving reprojected points to: {in_fc_pt}")
-            gdf.to_file(in_fc_pt)
-
             print("Sampling rasters...")
             sample_shapefile_path = os.path.join(self.ras_temp_path, "temp_sample.shp")
-            self.sample_rasters(rasters, in_fc_pt, sample_shapefile_path)
+            self.sample_rasters(rasters, gdf, sample_shapefile_path)
             print(f"Sampled data saved to: {sample_shapefile_path}")
 
             # Define paths for DBF and CSV
@@ -1,11 +1,100 @@
+import hashlib
+import json
+import math
+import threading
+from collections import OrderedDict
+
 import geopandas as gpd
 import numpy as np
-import rasterstats
+import pandas as pd
 import rasterio
+import scipy.ndimage as ndi
+import shapely
+from rasterio.errors import WindowError
+from rasterio.features import geometry_mask, rasterize
+from rasterio.windows import Window, from_bounds
 from pathlib import Path
 from shapely.geometry import box
 from django.conf import settings
 
+try:
+    from exactextract import exact_extract
+except ImportError:  # optional; zonal stats fall back to the rasterize/ndimage pass
+    exact_extract = None
+
+
+# Above this ratio of union-window to summed polygon-window pixels, read polygons one by one
+SPARSE_ZONE_RATIO = 4
+
+# Rasterized zone grids keyed by (geometry fingerprint, crs, transform, shape), most recent last.
+# Bounded by bytes, not entries: one country-scale int32 grid can exceed a gigabyte
+ZONE_CACHE_MAX_BYTES = 512 * 1024 ** 2
+# Grids larger than this are rebuilt on every request rather than pinned in memory
+ZONE_CACHE_MAX_ENTRY_BYTES = 128 * 1024 ** 2
+_zone_cache = OrderedDict()
+_zone_cache_bytes = 0
+_zone_cache_lock = threading.Lock()
+
+
+def _rasterize_zones(geometries, out_shape, transform, crs):
+    """
+    Burn geometries as zone ids 1..n (0 is background), reusing the grid
+    when the same polygons are summarised again on the same raster grid.
+    """
+    digest = hashlib.blake2b(b"".join(shapely.to_wkb(geometries)), digest_size=16).hexdigest()
+    key = (digest, crs.to_wkt() if crs else None, tuple(transform), tuple(out_shape))
+
+    with _zone_cache_lock:
+        zones = _zone_cache.get(key)
+        if zones is not None:
+            _zone_cache.move_to_end(key)
+            return zones
+
+    zones = rasterize(
+        ((geom, i + 1) for i, geom in enumerate(geometries)),
+        out_shape=out_shape,
+        transform=transform,
+        fill=0,
+        dtype="int32",
+    )
+    if zones.nbytes > ZONE_CACHE_MAX_ENTRY_BYTES:
+        return zones
+    zones.setflags(write=False)  # shared between requests
+
+    global _zone_cache_bytes
+    with _zone_cache_lock:
+        if key not in _zone_cache:
+            _zone_cache[key] = zones
+            _zone_cache_bytes += zones.nbytes
+        while _zone_cache_bytes > ZONE_CACHE_MAX_BYTES:
+            _, evicted = _zone_cache.popitem(last=False)
+            _zone_cache_bytes -= evicted.nbytes
+    return zones
+
+
+def _covering_window(bounds, transform, full):
+    """
+    Pixel window holding every pixel whose centre can fall inside bounds, clipped
+    to full. Offsets round down and far edges round up, so no edge pixel is lost.
+    """
+    win = from_bounds(*bounds, transform=transform)
+    col0, row0 = math.floor(win.col_off), math.floor(win.row_off)
+    col1 = math.ceil(win.col_off + win.width)
+    row1 = math.ceil(win.row_off + win.height)
+    return Window(col0, row0, col1 - col0, row1 - row0).intersection(full)
+
+
+def _zones_overlap(geometries):
+    """
+    Whether any two polygons share area. A single burned zone grid gives each
+    pixel to one polygon only, so overlapping zones must be read one by one.
+    """
+    if len(geometries) < 2:
+        return False
+    total = float(shapely.area(geometries).sum())
+    union = shapely.union_all(geometries).area
+    return total > union * (1 + 1e-9)
+
 
 class LandStatistics:
     def __init__(self, boundaries_geojson, raster_file, description, zone_id_column):
@@ -14,19 +103,23 @@ class LandStatistics:
         self.description = description
         self.zone_id_column = zone_id_column
 
+        # Resolve once; removeprefix strips the literal "/media/" (lstrip stripped a character set)
+        self._raster_path = Path(settings.MEDIA_ROOT) / raster_file.removeprefix('/media/')
+        if not self._raster_path.exists():
+            raise FileNotFoundError(f"Raster file not found at {self._raster_path}")
+
     def _load_boundaries(self):
         try:
-            boundaries = gpd.GeoDataFrame.from_features(self.boundaries_geojson['features'])
-            boundaries = boundaries.set_crs("EPSG:4326")
-            return boundaries
+            features = self.boundaries_geojson['features']
+            # Parse all geometries in one vectorized GEOS call instead of per-feature shape()
+            geoms = shapely.from_geojson([json.dumps(f['geometry']) for f in features])
+            properties = pd.DataFrame.from_records([f.get('properties') or {} for f in features])
+            return gpd.GeoDataFrame(properties, geometry=geoms, crs="EPSG:4326")
         except Exception as e:
             raise ValueError(f"Error parsing boundaries: {str(e)}")
 
     def _get_raster_path(self):
-        raster_path = Path(settings.MEDIA_ROOT) / self.raster_file.lstrip('/media/')
-        if not raster_path.exists():
-            raise FileNotFoundError(f"Raster file not found at {raster_path}")
-        return raster_path
+        return self._raster_path
 
     def _validate_raster_and_boundaries(self, boundaries):
         raster_path = self._get_raster_path()
@@ -43,6 +136,52 @@ class LandStatistics:
 
         return boundaries, raster_path
 
+    def _count_classes_in_union(self, src, geoms, win, n_classes):
+        """
+        Class counts per zone from one read of the window covering every polygon.
+        Only valid for disjoint polygons: each pixel is burned into a single zone.
+
+        Returns: (n_zones + 1, n_classes) array; row i + 1 is geoms[i]
+        """
+        # Native dtype, no masked array; nodata is excluded alongside out-of-range codes
+        data = src.read(1, window=win)
+
+        # Burn all polygons in one pass; zone i + 1 is boundaries row i, 0 is background
+        zones = _rasterize_zones(geoms, data.shape, src.window_transform(win), src.crs)
+
+        # Tally (zone, class) pairs with a single bincount instead of one mask per polygon
+        classes = data.astype(np.int64)
+        valid = (zones > 0) & (classes >= 1) & (classes < n_classes)
+        if src.nodata is not None:
+            valid &= data != src.nodata
+        idx = zones[valid].astype(np.int64) * n_classes + classes[valid]
+        return np.bincount(idx, minlength=(len(geoms) + 1) * n_classes).reshape(-1, n_classes)
+
+    def _count_classes_per_polygon(self, src, geoms, zone_windows, n_classes):
+        """
+        Class counts per zone reading each polygon's own window, for boundaries
+        that overlap or are spread so thinly that their combined window would be
+        mostly empty.
+
+        Returns: (n_zones + 1, n_classes) array; row i + 1 is geoms[i]
+        """
+        counts = np.zeros((len(geoms) + 1, n_classes), dtype=np.int64)
+        for i, (geom, zone_win) in enumerate(zip(geoms, zone_windows)):
+            if zone_win is None or zone_win.width == 0 or zone_win.height == 0:
+                continue
+
+            data = src.read(1, window=zone_win)
+            inside = geometry_mask(
+                [geom], out_shape=data.shape, transform=src.window_transform(zone_win), invert=True
+            )
+            if src.nodata is not None:
+                inside &= data != src.nodata
+
+            values = data[inside].astype(np.int64)
+            values = values[(values >= 1) & (values < n_classes)]
+            counts[i + 1] = np.bincount(values, minlength=n_classes)
+        return counts
+
     def _compute_land_suitability(self, boundaries, raster_path):
         # Define a mapping of class numbers to meaningful names
         class_meaning_map = {
@@ -53,61 +192,168 @@ class LandStatistics:
             5: "Very High Suitability %"
         }
 
+        n_classes = len(class_meaning_map) + 1  # slot 0 holds nothing, classes index directly
+
         results = []
         with rasterio.open(raster_path) as src:
-            for _, row in boundaries.iterrows():
-                mask = row.geometry
-                out_image, out_transform = rasterio.mask.mask(src, [mask], crop=True, nodata=np.nan)
-                data = out_image[0]
-
-                # Compute class counts
-                unique, counts = np.unique(data[~np.isnan(data)], return_counts=True)
-                class_counts = dict(zip(unique, counts))
-                total_count = sum(counts)
-
-                # Compute class percentages and apply rounding
-                class_percentages = {
-                    class_meaning_map[cls]: round((class_counts.get(cls, 0) / total_count * 100), 2)
-                    if total_count > 0 else 0.0
-                    for cls in class_meaning_map
-                }
-
-                # Convert to native Python types for JSON serialization
-                native_class_percentages = {
-                    key: float(value) for key, value in class_percentages.items()
-                }
-
-                results.append({
-                    "zone_id": str(row[self.zone_id_column]),  # Ensure zone_id is serializable
-                    **native_class_percentages
-                })
+            full = Window(0, 0, src.width, src.height)
+            win = _covering_window(boundaries.total_bounds, src.transform, full)
+
+            # Both paths below count the same pixels for disjoint zones: the windows cover
+            # every pixel centre, and rasterize and geometry_mask both burn by centre.
+            # The ratio only picks the cheaper read
+            geoms = boundaries.geometry.values
+            zone_windows = []
+            for geom in geoms:
+                try:
+                    zone_windows.append(_covering_window(geom.bounds, src.transform, full))
+                except WindowError:
+                    zone_windows.append(None)  # Polygon entirely off the raster
+            zone_pixels = sum(w.width * w.height for w in zone_windows if w is not None)
+
+            # Overlapping zones each keep their shared pixels, which one burned grid cannot express
+            if _zones_overlap(geoms) or win.width * win.height > zone_pixels * SPARSE_ZONE_RATIO:
+                counts = self._count_classes_per_polygon(src, geoms, zone_windows, n_classes)
+            else:
+                counts = self._count_classes_in_union(src, geoms, win, n_classes)
+
+        # Pull the id column out once instead of building a Series per row with iterrows
+        zone_ids = boundaries[self.zone_id_column].to_numpy()
+        for i, zone_id in enumerate(zone_ids):
+            zone_counts = counts[i + 1]
+            total_count = zone_counts.sum()
+
+            # Compute class percentages and apply rounding
+            class_percentages = {
+                label: round((zone_counts[cls] / total_count * 100), 2)
+                if total_count > 0 else 0.0
+                for cls, label in class_meaning_map.items()
+            }
+
+            # Convert to native Python types for JSON serialization
+            native_class_percentages = {
+                key: float(value) for key, value in class_percentages.items()
+            }
+
+            results.append({
+                "zone_id": str(zone_id),  # Ensure zone_id is serializable
+                **native_class_percentages
+            })
 
         return results
 
 
 
     def _compute_other_raster_types(self, boundaries, raster_path):
+        """
+        count/mean/min/max/std per zone. With exactextract (the supported path, listed
+        in targeting_environment.yml) edge pixels are weighted by the fraction each
+        polygon covers and the raster's nodata is honoured. Without it, pixels count
+        whole when their centre is inside and only NaN is nodata, as the original
+        zonal_stats(nodata=np.nan) did. The two can differ on the same request.
+        """
+        if exact_extract is not None:
+            return self._compute_exact_zonal_stats(boundaries, raster_path)
+
+        geoms = boundaries.geometry.values
+        overlap = _zones_overlap(geoms)
         try:
-            zonal_stats_result = rasterstats.zonal_stats(
-                boundaries,
+            with rasterio.open(raster_path) as src:
+                full = Window(0, 0, src.width, src.height)
+                if overlap:
+                    # Shared pixels count towards every zone that covers them
+                    counts, means, mins, maxs, stds = self._zonal_stats_per_polygon(src, geoms, full)
+                else:
+                    win = _covering_window(boundaries.total_bounds, src.transform, full)
+                    data = src.read(1, window=win)
+                    zones = _rasterize_zones(geoms, data.shape, src.window_transform(win), src.crs)
+        except Exception as e:
+            raise ValueError(f"Error performing zonal statistics: {str(e)}")
+
+        if not overlap:
+            # One labelled pass for every zone; NaN is nodata, as with zonal_stats(nodata=np.nan)
+            labels = np.where(np.isnan(data), 0, zones)
+            index = np.arange(1, len(boundaries) + 1)
+            counts = np.bincount(labels.ravel(), minlength=len(index) + 1)[1:]
+            means = ndi.mean(data, labels, index)
+            mins = ndi.minimum(data, labels, index)
+            maxs = ndi.maximum(data, labels, index)
+            stds = ndi.standard_deviation(data, labels, index)
+
+        if self.zone_id_column in boundaries.columns:
+            zone_ids = boundaries[self.zone_id_column].tolist()
+        else:
+            zone_ids = ['Unknown'] * len(boundaries)
+
+        results = []
+        for i, zone_id in enumerate(zone_ids):
+            has_data = counts[i] > 0
+            results.append({
+                "zone_id": zone_id,
+                "count": int(counts[i]),
+                "mean": float(means[i]) if has_data else 0.0,
+                "min": float(mins[i]) if has_data else 0.0,
+                "max": float(maxs[i]) if has_data else 0.0,
+                "std": float(stds[i]) if has_data else 0.0,
+            })
+
+        return results
+
+    def _zonal_stats_per_polygon(self, src, geoms, full):
+        """
+        count/mean/min/max/std per zone from each polygon's own masked window,
+        for overlapping zones that one burned zone grid cannot represent.
+
+        Returns: five arrays of length len(geoms); empty zones have count 0
+        """
+        n = len(geoms)
+        counts = np.zeros(n, dtype=np.int64)
+        means, mins, maxs, stds = (np.zeros(n) for _ in range(4))
+        for i, geom in enumerate(geoms):
+            try:
+                zone_win = _covering_window(geom.bounds, src.transform, full)
+            except WindowError:
+                continue  # Polygon entirely off the raster
+            if zone_win.width == 0 or zone_win.height == 0:
+                continue
+
+            data = src.read(1, window=zone_win)
+            inside = geometry_mask(
+                [geom], out_shape=data.shape, transform=src.window_transform(zone_win), invert=True
+            )
+            values = data[inside & ~np.isnan(data)].astype(np.float64)
+            if values.size:
+                counts[i] = values.size
+                means[i], mins[i], maxs[i], stds[i] = values.mean(), values.min(), values.max(), values.std()
+        return counts, means, mins, maxs, stds
+
+    def _compute_exact_zonal_stats(self, boundaries, raster_path):
+        # Edge pixels are weighted by the fraction of them each polygon covers
+        has_id = self.zone_id_column in boundaries.columns
+        try:
+            table = exact_extract(
                 str(raster_path),
-                stats=["count", "mean", "min", "max", "std"],
-                geojson_out=True,
-                nodata=np.nan
+                boundaries,
+                ["count", "mean", "min", "max", "stdev"],
+                include_cols=[self.zone_id_column] if has_id else None,
+                output="pandas",
             )
         except Exception as e:
             raise ValueError(f"Error performing zonal statistics: {str(e)}")
 
+        zone_ids = table[self.zone_id_column].tolist() if has_id else ['Unknown'] * len(table)
+        stats = table[["count", "mean", "min", "max", "stdev"]].to_numpy(dtype=np.float64)
+        stats = np.nan_to_num(stats, nan=0.0)
+
         results = []
-        for zone in zonal_stats_result:
-            zone_id = zone['properties'].get(self.zone_id_column, 'Unknown')
+        for zone_id, (count, mean, min_val, max_val, std) in zip(zone_ids, stats):
             results.append({
                 "zone_id": zone_id,
-                "count": int(zone['properties'].get("count", 0)),
-                "mean": float(zone['properties'].get("mean", 0)),
-                "min": float(zone['properties'].get("min", 0)),
-                "max": float(zone['properties'].get("max", 0)),
-                "std": float(zone['properties'].get("std", 0)),
+                "count": int(round(count)),
+                "mean": float(mean),
+                "min": float(min_val),
+                "max": float(max_val),
+                "std": float(std),
             })
 
         return results
@@ -1,10 +1,112 @@
+import hashlib
+import logging
+import math
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
 import numpy as np
 import rasterio
+import scipy.ndimage as ndi
 from pathlib import Path
 from django.conf import settings
 
-from rasterio.windows import from_bounds
-from rasterio.warp import reproject, Resampling
+try:
+    from numba import njit, prange
+except ImportError:  # optional; class splitting falls back to a NumPy radix sort
+    njit = None
+
+from rasterio.errors import WindowError
+from rasterio.transform import Affine
+from rasterio.vrt import WarpedVRT
+from rasterio.windows import Window, bounds as window_bounds, from_bounds
+from rasterio.warp import reproject, transform_bounds, Resampling
+
+# Class rasters carry these codes; everything else is nodata
+CLASS_LABELS = (1, 2, 3, 4, 5)
+
+# Overlaps larger than this are summarised block by block instead of read whole
+STREAM_MIN_PIXELS = 4096 * 4096
+
+# Bump when the on-disk layout of cached aligned references changes, so old entries miss
+ALIGNED_REF_CACHE_VERSION = 2
+
+# Least recently used aligned references are evicted once the cache grows past this
+ALIGNED_REF_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+
+def _counts5(class_u8):
+    """Pixel count per class code in CLASS_LABELS of a uint8 masked class raster."""
+    # Count the plain data, then take back the (usually few) masked pixels, rather than
+    # materialising a filled() copy of the whole raster
+    size = max(len(CLASS_LABELS) + 1, 256)
+    counts = np.bincount(class_u8.data.ravel(), minlength=size)
+    mask = np.ma.getmaskarray(class_u8)
+    if mask.any():
+        counts -= np.bincount(class_u8.data[mask], minlength=size)
+    return counts[1:len(CLASS_LABELS) + 1]
+
+
+def _class_percentages(counts, label_map):
+    """Percentage of valid class pixels per label, rounded for the response."""
+    total_count = int(counts.sum())
+    if total_count == 0:
+        return {label: 0.0 for label in label_map.values()}
+    percentages = counts.astype(np.float64) * (100.0 / total_count)
+    return {label: round(float(p), 2) for label, p in zip(label_map.values(), percentages)}
+
+
+if njit is not None:
+
+    @njit(parallel=True, cache=True)
+    def _split_by_class_kernel(labels, values, size, n_chunks):
+        """Counting sort of values by label in two parallel passes over the pixels."""
+        n = labels.size
+        step = (n + n_chunks - 1) // n_chunks
+
+        # Pass 1: per-chunk class histograms, so threads never share a counter
+        hist = np.zeros((n_chunks, size), dtype=np.int64)
+        for k in prange(n_chunks):
+            for i in range(k * step, min(n, (k + 1) * step)):
+                hist[k, labels[i]] += 1
+
+        # Exclusive prefix sums give each (chunk, class) its own output slice
+        starts = np.zeros((n_chunks, size), dtype=np.int64)
+        offset = 0
+        for c in range(size):
+            for k in range(n_chunks):
+                starts[k, c] = offset
+                offset += hist[k, c]
+
+        # Pass 2: scatter every value into its class slice
+        out = np.empty(n, dtype=values.dtype)
+        for k in prange(n_chunks):
+            cursor = starts[k].copy()
+            for i in range(k * step, min(n, (k + 1) * step)):
+                c = labels[i]
+                out[cursor[c]] = values[i]
+                cursor[c] += 1
+        return out
+
+
+def _split_by_class(labels, values, counts):
+    """
+    Group values by integer label (0 is dropped) in a single pass.
+
+    Returns: list of compact 1D arrays, one per label 1..len(counts)
+    """
+    labels = labels.ravel()
+    values = values.ravel()
+    size = len(counts) + 1
+    if njit is not None:
+        grouped = _split_by_class_kernel(labels.astype(np.intp), values, size, os.cpu_count() or 1)
+    else:
+        # Stable sort on uint8 keys is a radix sort, so this stays O(N)
+        grouped = values[np.argsort(labels.astype(np.uint8), kind="stable")]
+
+    bounds = np.cumsum(np.concatenate(([grouped.size - int(np.sum(counts))], counts)))
+    return np.split(grouped, bounds)[1:size]
 
 
 class LandStatistics:
@@ -15,24 +117,32 @@ class LandStatistics:
         description,
         stat_types=None,
         reference_kind=None,  # "continuous" | "categorical" | None (auto)
+        reference_scale=None,  # (offset, scale, int dtype) to quantize the reference, or None
+        decimation_factor=1,  # read every k-th pixel (via overviews when present) for quick summaries
     ):
         self.reference_layer = reference_layer
         self.raster_file = raster_file
         self.description = description
         self.stat_types = stat_types or ["mean"]
         self.reference_kind = reference_kind
+        self.reference_scale = reference_scale
+        self.decimation_factor = max(1, int(decimation_factor))
+        self._dst_buf = None
+
+        # Resolve once; removeprefix strips the literal "/media/" (lstrip stripped a character set)
+        self._raster_path = Path(settings.MEDIA_ROOT) / raster_file.removeprefix("/media/")
+        if not self._raster_path.exists():
+            raise FileNotFoundError(f"Raster file not found at {self._raster_path}")
+
+        self._reference_path = Path(settings.BASE_DIR) / reference_layer
+        if not self._reference_path.exists():
+            raise FileNotFoundError(f"Reference file not found at {self._reference_path}")
 
     def _get_raster_path(self):
-        raster_path = Path(settings.MEDIA_ROOT) / self.raster_file.lstrip("/media/")
-        if not raster_path.exists():
-            raise FileNotFoundError(f"Raster file not found at {raster_path}")
-        return raster_path
+        return self._raster_path
 
     def _get_reference_path(self):
-        reference_path = Path(settings.BASE_DIR) / self.reference_layer
-        if not reference_path.exists():
-            raise FileNotFoundError(f"Reference file not found at {reference_path}")
-        return reference_path
+        return self._reference_path
 
     # -----------------------------
     # Alignment helpers
@@ -59,7 +169,7 @@ class LandStatistics:
         w = min(512, ref_src.width)
         window = rasterio.windows.Window(0, 0, w, h)
         sample = ref_src.read(1, window=window, masked=True)
-        vals = sample.compressed()
+        vals = sample.data[~np.ma.getmaskarray(sample)]
 
         if vals.size == 0:
             return Resampling.nearest
@@ -68,25 +178,178 @@ class LandStatistics:
         # If few unique values, likely class codes => categorical
         return Resampling.nearest if uniq.size <= 50 else Resampling.bilinear
 
-    def _read_class_and_aligned_ref(self, class_src, ref_src):
+    def _warp_buffer(self, shape, ref_src, resampling):
         """
-        Read suitability/quantile raster as target grid,
-        then read reference raster and align it to class grid.
+        Destination buffer for warped reference pixels, reused across warps.
+        Nearest-neighbour warps of integer references with a declared nodata stay in
+        their dtype with that value as sentinel; everything else warps to float32
+        with NaN as nodata.
 
-        Returns: (class_data_masked, ref_aligned_masked)
+        Returns: (buffer, nodata)
         """
-        class_data = class_src.read(1, masked=True)
+        dtype, nodata = self._warp_dtype_and_nodata(ref_src, resampling)
+
+        # reproject and WarpedVRT reads overwrite every pixel, so no fill is needed
+        buf = self._dst_buf
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = self._dst_buf = np.empty(shape, dtype=dtype)
+        return buf, nodata
+
+    @staticmethod
+    def _warp_dtype_and_nodata(ref_src, resampling):
+        dtype = np.dtype(ref_src.dtypes[0])
+        # Only a declared nodata is a safe sentinel; any other integer could be real data
+        if (
+            resampling == Resampling.nearest
+            and np.issubdtype(dtype, np.integer)
+            and ref_src.nodata is not None
+        ):
+            return dtype, dtype.type(ref_src.nodata)
+        return np.dtype("float32"), np.nan
+
+    @staticmethod
+    def _nodata_mask(dst, nodata):
+        return np.isnan(dst) if np.isnan(nodata) else dst == nodata
+
+    @staticmethod
+    def _aligned_ref_cache_dir():
+        # Outside MEDIA_ROOT: cached arrays are internal and must not be served
+        default = Path(settings.BASE_DIR) / "cache" / "stats_cache"
+        return Path(getattr(settings, "STATS_CACHE_DIR", default))
+
+    def _aligned_ref_cache_path(self, ref_src, dst_crs, dst_transform, shape, resampling, dtype, nodata):
+        """
+        On-disk location of the reference warped onto a given grid. The key covers
+        the reference file version, the full target grid and the stored dtype and
+        nodata, so any change misses.
+        """
+        stat = os.stat(ref_src.name)
+        key = "|".join(
+            str(part)
+            for part in (
+                ALIGNED_REF_CACHE_VERSION,
+                os.path.abspath(ref_src.name),
+                stat.st_mtime_ns,
+                stat.st_size,
+                dst_crs.to_wkt() if dst_crs else None,
+                tuple(dst_transform),
+                tuple(shape),
+                resampling.name,
+                np.dtype(dtype).str,
+                nodata,
+            )
+        )
+        return self._aligned_ref_cache_dir() / f"{hashlib.sha256(key.encode()).hexdigest()}.npy"
 
-        # If already same grid, no work
-        same_grid = (
+    @staticmethod
+    def _store_aligned_ref(cache_path, data):
+        """
+        Publish data at cache_path atomically, then evict the least recently used
+        entries beyond ALIGNED_REF_CACHE_MAX_BYTES. Best effort: a full disk, or an
+        entry another request holds memory-mapped (locked on Windows), is logged
+        and skipped, never failing the request that already has data in memory.
+        """
+        # A unique temp file per writer, so concurrent warps of one key never interleave
+        tmp_name = None
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=cache_path.parent, suffix=".npy", delete=False) as tmp:
+                tmp_name = tmp.name
+                np.save(tmp, data)
+            os.replace(tmp_name, cache_path)
+        except OSError as e:
+            logging.warning("Could not cache aligned reference at %s: %s", cache_path, e)
+            if tmp_name is not None:
+                try:
+                    os.unlink(tmp_name)
+                except OSError:
+                    pass
+            return
+
+        entries = []
+        try:
+            with os.scandir(cache_path.parent) as it:
+                for entry in it:
+                    if not entry.name.endswith(".npy") or entry.name.startswith("tmp"):
+                        continue  # Leave other writers' temp files alone
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime_ns, st.st_size, entry.path))
+        except OSError as e:
+            logging.warning("Could not scan aligned reference cache %s: %s", cache_path.parent, e)
+            return
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= ALIGNED_REF_CACHE_MAX_BYTES:
+                break
+            if path == str(cache_path):
+                continue
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.warning("Could not evict cached aligned reference %s: %s", path, e)
+                continue
+            total -= size
+
+    def _overlap_window(self, class_src, ref_src):
+        """
+        Window on the class grid covering only the overlap of both rasters,
+        so reads and warps stay proportional to the area actually analysed.
+        """
+        ref_bounds = ref_src.bounds
+        if ref_src.crs != class_src.crs:
+            ref_bounds = transform_bounds(ref_src.crs, class_src.crs, *ref_bounds)
+
+        cb = class_src.bounds
+        left, bottom = max(cb.left, ref_bounds[0]), max(cb.bottom, ref_bounds[1])
+        right, top = min(cb.right, ref_bounds[2]), min(cb.top, ref_bounds[3])
+        if left >= right or bottom >= top:
+            raise ValueError("Reference layer does not overlap the raster extent.")
+
+        win = from_bounds(left, bottom, right, top, transform=class_src.transform)
+        win = win.round_offsets().round_lengths()
+        return win.intersection(Window(0, 0, class_src.width, class_src.height))
+
+    @staticmethod
+    def _same_grid(class_src, ref_src):
+        return (
             class_src.crs == ref_src.crs
             and class_src.transform == ref_src.transform
             and class_src.width == ref_src.width
             and class_src.height == ref_src.height
         )
-        if same_grid:
-            ref_data = ref_src.read(1, masked=True)
-            return class_data, ref_data
+
+    def _read_class_and_aligned_ref(self, class_src, ref_src, win):
+        """
+        Read suitability/quantile raster as target grid (limited to the overlap
+        window with the reference), then read reference raster and align it to that grid.
+
+        Returns: (class_data_masked, ref_aligned_masked)
+        """
+        # Decimated reads come from overviews when the file has them
+        k = self.decimation_factor
+        out_shape = (max(1, int(win.height) // k), max(1, int(win.width) // k))
+        # Class codes are small ints; uint8 (GDAL clamps out-of-range codes) cuts bandwidth
+        class_data = class_src.read(
+            1, window=win, masked=True, out_shape=out_shape, resampling=Resampling.nearest,
+            out_dtype=np.uint8,
+        )
+        dst_transform = class_src.window_transform(win) * Affine.scale(
+            win.width / out_shape[1], win.height / out_shape[0]
+        )
+
+        # If already same grid, no work
+        if self._same_grid(class_src, ref_src):
+            resampling = Resampling.nearest if k == 1 else self._pick_resampling_for_reference(ref_src)
+            ref_data = ref_src.read(
+                1, window=win, masked=True, out_shape=out_shape, resampling=resampling
+            )
+            return class_data, self._quantize_reference(ref_data)
 
         resampling = self._pick_resampling_for_reference(ref_src)
 
@@ -94,12 +357,13 @@ class LandStatistics:
         use_window = class_src.crs == ref_src.crs
 
         if use_window:
-            b = class_src.bounds
-            win = from_bounds(b.left, b.bottom, b.right, b.top, transform=ref_src.transform)
-            win = win.round_offsets().round_lengths()
+            b = window_bounds(win, class_src.transform)
+            ref_win = from_bounds(*b, transform=ref_src.transform)
+            ref_win = ref_win.round_offsets().round_lengths()
+            ref_win = ref_win.intersection(Window(0, 0, ref_src.width, ref_src.height))
 
-            ref_subset = ref_src.read(1, window=win, masked=True)
-            ref_subset_transform = ref_src.window_transform(win)
+            ref_subset = ref_src.read(1, window=ref_win, masked=True)
+            ref_subset_transform = ref_src.window_transform(ref_win)
 
             src = ref_subset
             src_transform = ref_subset_transform
@@ -108,21 +372,44 @@ class LandStatistics:
             src = rasterio.band(ref_src, 1)
             src_transform = ref_src.transform
 
-        # Warp reference onto class grid
-        dst = np.full((class_src.height, class_src.width), np.nan, dtype="float32")
-
-        reproject(
-            source=src,
-            destination=dst,
-            src_transform=src_transform,
-            src_crs=ref_src.crs,
-            dst_transform=class_src.transform,
-            dst_crs=class_src.crs,
-            dst_nodata=np.nan,
-            resampling=resampling,
+        # Warp reference onto class grid, or reuse the grid a previous request warped
+        dst, nodata = self._warp_buffer(class_data.shape, ref_src, resampling)
+        cache_path = self._aligned_ref_cache_path(
+            ref_src, class_src.crs, dst_transform, class_data.shape, resampling, dst.dtype, nodata
         )
+        try:
+            cached = np.load(cache_path, mmap_mode="r")
+        except FileNotFoundError:
+            cached = None
+        except (OSError, ValueError) as e:
+            logging.warning("Ignoring unreadable cached aligned reference %s: %s", cache_path, e)
+            cached = None
+        if cached is not None:
+            dst = cached
+            try:
+                os.utime(cache_path)  # Mark as recently used for eviction
+            except OSError:
+                pass
+        else:
+            reproject(
+                source=src,
+                destination=dst,
+                src_transform=src_transform,
+                src_crs=ref_src.crs,
+                dst_transform=dst_transform,
+                dst_crs=class_src.crs,
+                dst_nodata=nodata,
+                resampling=resampling,
+            )
 
-        ref_aligned = np.ma.masked_invalid(dst)
+            # Write then rename so a concurrent request never loads a partial file
+            self._store_aligned_ref(cache_path, dst)
+
+        if np.isnan(nodata):
+            ref_aligned = np.ma.masked_invalid(dst, copy=False)
+        else:
+            # Integer sentinel: a plain equality test, no float promotion or NaN scan
+            ref_aligned = np.ma.masked_equal(dst, nodata, copy=False)
 
         # Final safety check
         if ref_aligned.shape != class_data.shape:
@@ -130,37 +417,234 @@ class LandStatistics:
                 f"Alignment failed: class={class_data.shape}, ref={ref_aligned.shape}"
             )
 
-        return class_data, ref_aligned
+        return class_data, self._quantize_reference(ref_aligned)
 
     def _compute_stats_for_values(self, values):
-        """Compute requested stats on a 1D numpy array of values."""
+        """Compute requested stats on a 1D numpy array of values, touching only what is asked for."""
         out = {}
-        if values.size == 0:
+        n = values.size
+        if n == 0:
             for stat in self.stat_types:
                 out[stat] = None
             return out
 
+        wanted = set(self.stat_types)
+        total = float(values.sum(dtype=np.float64)) if wanted & {"mean", "sum", "std"} else None
+
         for stat in self.stat_types:
             try:
                 if stat == "mean":
-                    out["mean"] = float(np.mean(values))
+                    out["mean"] = total / n
                 elif stat == "sum":
-                    out["sum"] = float(np.sum(values))
+                    out["sum"] = total
                 elif stat == "median":
-                    out["median"] = float(np.median(values))
+                    # O(N) selection instead of a full sort
+                    part = np.partition(values, [(n - 1) // 2, n // 2])
+                    out["median"] = (float(part[(n - 1) // 2]) + float(part[n // 2])) / 2
                 elif stat == "min":
-                    out["min"] = float(np.min(values))
+                    out["min"] = float(values.min())
                 elif stat == "max":
-                    out["max"] = float(np.max(values))
+                    out["max"] = float(values.max())
                 elif stat == "std":
-                    out["std"] = float(np.std(values))
+                    # One pass of squares instead of np.std's mean-then-deviations
+                    mean = total / n
+                    sq = values.astype(np.float64)
+                    np.square(sq, out=sq)
+                    out["std"] = math.sqrt(max(sq.sum() / n - mean * mean, 0.0))
                 else:
                     out[stat] = None
             except Exception:
                 out[stat] = None
         return out
 
-    
+    def _compute_stats_per_class(self, class_data, ref_data, classes):
+        """
+        Compute requested stats of ref_data for each class code in one labelled pass.
+
+        Returns: list of stats dicts, in the order of classes
+        """
+        index = list(classes)
+
+        # Label 0 drops pixels that are nodata in either raster (getmaskarray copes with nomask);
+        # labels stay uint8 as read
+        labels = class_data.data.copy()
+        invalid = np.ma.getmaskarray(class_data) | np.ma.getmaskarray(ref_data)
+        labels[invalid] = 0
+        values = ref_data.data
+        counts = np.bincount(labels.ravel(), minlength=max(index) + 1)[index]
+
+        # Median breaks labelled reductions, so hand each class its own compact array
+        if "median" in self.stat_types:
+            labels[labels > max(index)] = 0
+            groups = _split_by_class(labels, values, counts)
+            # Classes are independent and NumPy drops the GIL in its reductions
+            with ThreadPoolExecutor(max_workers=min(len(groups), os.cpu_count() or 1)) as executor:
+                stats = list(executor.map(self._compute_stats_for_values, groups))
+        else:
+            reducers = {
+                "mean": ndi.mean,
+                "sum": ndi.sum,
+                "min": ndi.minimum,
+                "max": ndi.maximum,
+                "std": ndi.standard_deviation,
+            }
+            per_stat = {}
+            for stat in self.stat_types:
+                try:
+                    per_stat[stat] = reducers[stat](values, labels, index) if stat in reducers else None
+                except Exception:
+                    per_stat[stat] = None
+
+            # Classes with no valid pixels report None for every stat
+            stats = [
+                {
+                    stat: float(res[i]) if res is not None and n > 0 else None
+                    for stat, res in per_stat.items()
+                }
+                for i, n in enumerate(counts)
+            ]
+
+        if self.reference_scale is not None:
+            for class_stats, n in zip(stats, counts):
+                self._unscale_stats(class_stats, int(n))
+        return stats
+
+    def _quantize_reference(self, ref_data):
+        """
+        Store the aligned reference as scaled integers when reference_scale is set,
+        so the stats passes scan 1-2 bytes per pixel instead of 4-8.
+        """
+        if self.reference_scale is None:
+            return ref_data
+
+        offset, scale, dtype = self.reference_scale
+        info = np.iinfo(dtype)
+        q = (ref_data.filled(offset) - offset) / scale
+        q = np.clip(np.round(q), info.min, info.max).astype(dtype)
+        return np.ma.masked_array(q, mask=np.ma.getmaskarray(ref_data))
+
+    def _unscale_stats(self, stats, n):
+        """Map stats of quantized values back to reference units, in place."""
+        offset, scale, _ = self.reference_scale
+        for stat, value in stats.items():
+            if value is None:
+                continue
+            if stat == "sum":
+                stats[stat] = value * scale + n * offset
+            elif stat == "std":
+                stats[stat] = value * scale
+            else:  # mean, median, min, max
+                stats[stat] = value * scale + offset
+
+    def _stream_class_stats(self, class_src, ref_src, win, n_classes=5):
+        """
+        Accumulate class counts and per-class reference stats block by block over
+        the overlap window, so memory is bounded by the block size, not the raster.
+        Median needs every value at once and is not available here.
+
+        Returns: (class counts, list of stats dicts for classes 1..n_classes)
+        """
+        same_grid = self._same_grid(class_src, ref_src)
+        resampling = None if same_grid else self._pick_resampling_for_reference(ref_src)
+
+        size = n_classes + 1  # bin 0 collects nodata and out-of-range codes
+        counts = np.zeros(size, dtype=np.int64)
+        n = np.zeros(size, dtype=np.int64)
+        total = np.zeros(size)
+        total_sq = np.zeros(size)
+        lo = np.full(size, np.inf)
+        hi = np.full(size, -np.inf)
+
+        # One warped view set up for the whole pass instead of a reproject per block
+        if same_grid:
+            aligned = nullcontext()
+        else:
+            dtype, nodata = self._warp_dtype_and_nodata(ref_src, resampling)
+            aligned = WarpedVRT(
+                ref_src,
+                crs=class_src.crs,
+                transform=class_src.transform,
+                width=class_src.width,
+                height=class_src.height,
+                resampling=resampling,
+                src_nodata=ref_src.nodata,
+                nodata=nodata,
+                dtype=dtype,
+            )
+
+        with aligned as vrt:
+            for _, block in class_src.block_windows(1):
+                try:
+                    block = block.intersection(win)
+                except WindowError:
+                    continue
+
+                class_blk = class_src.read(1, window=block, masked=True, out_dtype=np.uint8)
+                labels = class_blk.data.astype(np.intp)
+                invalid = np.ma.getmaskarray(class_blk)  # block-local, safe to update in place
+                np.logical_or(invalid, labels >= size, out=invalid)
+                labels[invalid] = 0
+                counts += np.bincount(labels.ravel(), minlength=size)
+
+                if same_grid:
+                    ref_blk = ref_src.read(1, window=block, masked=True)
+                    values = ref_blk.data
+                    labels[np.ma.getmaskarray(ref_blk)] = 0
+                else:
+                    # The warped view is already on the class grid; read the block into a reused buffer
+                    dst, nodata = self._warp_buffer(labels.shape, ref_src, resampling)
+                    vrt.read(1, window=block, out=dst)
+                    values = dst
+                    labels[self._nodata_mask(dst, nodata)] = 0
+
+                labels = labels.ravel()
+                values = values.ravel().astype(np.float64)
+                block_n = np.bincount(labels, minlength=size)
+                n += block_n
+                total += np.bincount(labels, weights=values, minlength=size)
+                total_sq += np.bincount(labels, weights=values * values, minlength=size)
+
+                present = np.flatnonzero(block_n[1:]) + 1
+                if present.size:
+                    lo[present] = np.minimum(lo[present], ndi.minimum(values, labels, present))
+                    hi[present] = np.maximum(hi[present], ndi.maximum(values, labels, present))
+
+        mean = total / np.maximum(n, 1)
+        finals = {
+            "mean": mean,
+            "sum": total,
+            "min": lo,
+            "max": hi,
+            "std": np.sqrt(np.maximum(total_sq / np.maximum(n, 1) - mean ** 2, 0)),
+        }
+        stats = [
+            {
+                stat: float(finals[stat][cls]) if stat in finals and n[cls] > 0 else None
+                for stat in self.stat_types
+            }
+            for cls in range(1, size)
+        ]
+        return counts[1:], stats
+
+    def _class_counts_and_stats(self, class_src, ref_src, classes):
+        """
+        Class pixel counts plus per-class reference stats over the overlap of both
+        rasters. Large full-resolution overlaps are streamed unless a median was asked for.
+        """
+        win = self._overlap_window(class_src, ref_src)
+        streamable = self.decimation_factor == 1 and "median" not in self.stat_types
+        if streamable and win.width * win.height > STREAM_MIN_PIXELS:
+            return self._stream_class_stats(class_src, ref_src, win, len(classes))
+
+        class_data, ref_data = self._read_class_and_aligned_ref(class_src, ref_src, win)
+        return _counts5(class_data), self._compute_stats_per_class(class_data, ref_data, classes)
+
+    def _result_entry(self, class_percentages, stats_per_class):
+        entry = {"stat_label": class_percentages, "statistics": stats_per_class}
+        if self.decimation_factor > 1:
+            entry["decimated"] = self.decimation_factor
+        return entry
+
     def _compute_land_suitability_with_reference_layer(self, raster_path, reference_path):
         class_meaning_map = {
             1: "Very Low Suitability %",
@@ -172,34 +656,13 @@ class LandStatistics:
 
         results = []
         with rasterio.open(raster_path) as class_src, rasterio.open(reference_path) as ref_src:
-            class_data, ref_data = self._read_class_and_aligned_ref(class_src, ref_src)
-
-            # Total pixels used for percentage calc (only valid class pixels)
-            unique, counts = np.unique(class_data.compressed(), return_counts=True)
-            class_counts = dict(zip(unique, counts))
-            total_count = int(np.sum(counts))
-
-            class_percentages = {
-                class_meaning_map.get(cls, f"Class {int(cls)} %"): round(
-                    (class_counts.get(cls, 0) / total_count * 100), 2
-                )
-                if total_count > 0
-                else 0.0
-                for cls in class_meaning_map
-            }
-
-            stats_per_class = {class_meaning_map[cls]: {} for cls in class_meaning_map}
+            counts, class_stats = self._class_counts_and_stats(class_src, ref_src, class_meaning_map)
 
-            for cls, label in class_meaning_map.items():
-                class_mask = (class_data == cls)
+        # Total pixels used for percentage calc (only valid class pixels)
+        class_percentages = _class_percentages(counts, class_meaning_map)
+        stats_per_class = dict(zip(class_meaning_map.values(), class_stats))
 
-                # Important: combine masks so we don't include nodata from either raster
-                combined = class_mask & (~class_data.mask) & (~ref_data.mask)
-
-                values = ref_data[combined].compressed()
-                stats_per_class[label] = self._compute_stats_for_values(values)
-
-        results.append({"stat_label": class_percentages, "statistics": stats_per_class})
+        results.append(self._result_entry(class_percentages, stats_per_class))
         return results
 
     def _compute_quantile_class_statistics(self, raster_path, reference_path):
@@ -230,30 +693,13 @@ class LandStatistics:
 
         results = []
         with rasterio.open(raster_path) as class_src, rasterio.open(reference_path) as ref_src:
-            class_data, ref_data = self._read_class_and_aligned_ref(class_src, ref_src)
-
-            unique, counts = np.unique(class_data.compressed(), return_counts=True)
-            class_counts = dict(zip(unique, counts))
-            total_count = int(np.sum(counts))
-
-            class_percentages = {
-                quantile_label_map.get(cls, f"Class {int(cls)}"): round(
-                    (class_counts.get(cls, 0) / total_count * 100), 2
-                )
-                if total_count > 0
-                else 0.0
-                for cls in quantile_label_map
-            }
-
-            stats_per_class = {quantile_label_map[cls]: {} for cls in quantile_label_map}
+            counts, class_stats = self._class_counts_and_stats(class_src, ref_src, quantile_label_map)
 
-            for cls, label in quantile_label_map.items():
-                class_mask = (class_data == cls)
-                combined = class_mask & (~class_data.mask) & (~ref_data.mask)
-                values = ref_data[combined].compressed()
-                stats_per_class[label] = self._compute_stats_for_values(values)
+        # Total pixels used for percentage calc (only valid class pixels)
+        class_percentages = _class_percentages(counts, quantile_label_map)
+        stats_per_class = dict(zip(quantile_label_map.values(), class_stats))
 
-        results.append({"stat_label": class_percentages, "statistics": stats_per_class})
+        results.append(self._result_entry(class_percentages, stats_per_class))
         return results
 
     def compute_statistics(self):
@@ -5,15 +5,74 @@ import geopandas as gpd
 import re
 import time
 import rasterio
-import rasterio.mask
 from shapely.geometry import box
 from collections import OrderedDict
 from pyproj import Transformer
-import rasterio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import lru_cache, partial
+from rasterio.errors import WindowError
+from rasterio.io import MemoryFile
+from rasterio.vrt import WarpedVRT
 from rasterio.warp import reproject, Resampling
+from rasterio.windows import Window, from_bounds
 from .reclassify import reclassify
+from ._kernels import add_log, exp_mean, suitability_kernel
 from .main_tool import TargetingTool  
 
+# Intermediate and output rasters are written as tiled, compressed float32 GeoTIFFs and
+# processed one tile at a time
+BLOCK_SIZE = 512
+WRITE_PROFILE = {
+    "driver": "GTiff", "count": 1, "dtype": "float32",
+    "tiled": True, "blockxsize": BLOCK_SIZE, "blockysize": BLOCK_SIZE,
+    "compress": "DEFLATE", "predictor": 2, "bigtiff": "IF_SAFER",
+}
+
+# Overview levels built on the final classified raster
+OVERVIEW_FACTORS = (2, 4, 8, 16, 32)
+
+# Value-table parameters are named <token><row number>; tokens are matched in this order
+_KEY_RE = re.compile(r'\d+')
+VALUE_TABLE_FIELDS = {
+    'in_raster': 'url', 'min_val': 'min_val', 'opti_from': 'opti_from',
+    'opti_to': 'opti_to', 'max_val': 'max_val', 'combine': 'combine',
+}
+
+# GDAL settings for a run: a larger block cache and threaded DEFLATE (de)compression, plus
+# cached, listing-free opens for inputs served as COGs over HTTP/S3
+GDAL_ENV = {
+    "GDAL_CACHEMAX": 512,
+    "GDAL_NUM_THREADS": "ALL_CPUS",
+    "VSI_CACHE": True,
+    "VSI_CACHE_SIZE": 256 * 1024 * 1024,
+    "GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR",
+    "CPL_VSIL_CURL_ALLOWED_EXTENSIONS": ".tif,.tiff",
+}
+
+# Upper bound on input rasters normalized concurrently
+NORMALIZE_WORKERS = 8
+
+
+@lru_cache(maxsize=32)
+def _transformer(src_crs, dst_crs):
+    """Shared pyproj Transformer per CRS pair; building one costs milliseconds."""
+    return Transformer.from_crs(src_crs, dst_crs, always_xy=True)
+
+
+def _group_max(members, window):
+    """Pixel-wise maximum of one window across a combine group's datasets."""
+    # Running maximum; only two blocks are resident at a time
+    max_data = None
+    for vrt in members:
+        block = vrt.read(1, window=window, out_dtype=np.float32)
+        if max_data is None:
+            max_data = block
+        else:
+            np.maximum(max_data, block, out=max_data)
+    return max_data
+
+
 class LandSuitability(TargetingTool):
     def __init__(self, parameters):
         """Initialize the Land Suitability tool with the given parameters."""
@@ -23,6 +82,8 @@ class LandSuitability(TargetingTool):
         self.canRunInBackground = False
         self.value_table_cols = 6
         self.parameters = parameters
+        # Intermediate rasters live in /vsimem, keyed by name; only final outputs touch disk
+        self._memfiles = {}
 
     def get_value_table_count(self, parameters):
         """Count the number of input rasters based on the parameters."""
@@ -36,24 +97,15 @@ class LandSuitability(TargetingTool):
         """Organize the input parameters into an ordered dictionary for easy access during processing."""
         value_table = OrderedDict()
         for key, param in parameters.items():
-            if re.search(r'\d+', key) is None:
+            match = _KEY_RE.search(key)
+            if match is None:
                 continue
 
-            idx = int(re.search(r'\d+', key).group()) - 1
-            if idx not in value_table.keys():
-                value_table[idx] = {}
-            if 'in_raster' in key:
-                value_table[idx]['url'] = param['url']
-            elif 'min_val' in key:
-                value_table[idx]['min_val'] = param
-            elif 'opti_from' in key:
-                value_table[idx]['opti_from'] = param
-            elif 'opti_to' in key:
-                value_table[idx]['opti_to'] = param
-            elif 'max_val' in key:
-                value_table[idx]['max_val'] = param
-            elif 'combine' in key:
-                value_table[idx]['combine'] = param
+            row = value_table.setdefault(int(match.group()) - 1, {})
+            for token, field in VALUE_TABLE_FIELDS.items():
+                if token in key:
+                    row[field] = param['url'] if token == 'in_raster' else param
+                    break
 
         return value_table
 
@@ -63,12 +115,10 @@ class LandSuitability(TargetingTool):
 
     def execute(self):
         """Main processing workflow for the Land Suitability tool."""
-        i = 0
-        ras_max_min = True
         parameters = self.parameters
         in_raster = self.prepare_value_table(parameters)
-        num_rows = len(in_raster)
-        out_ras = self.output_name(in_raster)
+        # Parse the value table once; every stage below works from these rows
+        rows = list(self.get_row_value(in_raster, ras_max_min=True))
 
         # Define workspace and media directories
         workspace_path = os.getcwd().replace("\\", "/")
@@ -86,14 +136,26 @@ class LandSuitability(TargetingTool):
         if os.path.isdir(ras_temp_path):
             for root, dirs, files in os.walk(ras_temp_path):
                 for f in files:
-                    f_path = os.path.join(ras_temp_path, f)
+                    f_path = os.path.join(root, f)
                     if not f.endswith(('.shp', '.dbf', '.sbn', '.cpg', '.prj', '.shp.xml', '.sbx', '.shx', '.lock')):
                         os.remove(f_path)
 
-        out_ras_path = f'{ras_temp_path}/{out_ras}'
         if not os.path.exists(ras_temp_path):
             os.makedirs(ras_temp_path)
 
+        try:
+            with rasterio.Env(**GDAL_ENV):
+                result_relative_url = self._run(rows, ras_temp_path, media_dir, ts)
+        finally:
+            for memfile in self._memfiles.values():
+                memfile.close()
+            self._memfiles.clear()
+
+        return result_relative_url
+
+    def _run(self, rows, ras_temp_path, media_dir, ts):
+        """Normalize, combine and reclassify the input rasters; returns the output media URL."""
+        parameters = self.parameters
         valid_rasters = 0
 
         # Check if AOI (Area of Interest) is provided and process accordingly
@@ -101,231 +163,189 @@ class LandSuitability(TargetingTool):
             in_fc = self.get_extent_from_aoi(parameters['out_extent'])
             extent = in_fc.total_bounds  # Get feature class extent
             print(f"AOI extent: {extent}")
-            valid_rasters += self.raster_minus_init(in_raster, ras_max_min, ras_temp_path, in_fc, extent)
+            valid_rasters += self.raster_normalize_init(rows, in_fc, extent)
         else:
-            valid_rasters += self.raster_minus_init(in_raster, ras_max_min, ras_temp_path, in_fc=None, extent=None)
+            valid_rasters += self.raster_normalize_init(rows, in_fc=None, extent=None)
 
         if valid_rasters == 0:
             raise ValueError("No valid rasters intersect with the AOI. Check your inputs.")
 
-        # Initial condition checks on rasters
-        self.raster_condition_init(num_rows, "ras_min1_", "ras_min2_", "ras_max1_", "ras_max2_", ras_temp_path, "<", "0")
-
-        # Divide rasters by optimal values to normalize them
-        for ras_file, min_val, max_val, opt_from_val, opt_to_val, ras_combine, row_count in self.get_row_value(in_raster, ras_max_min):
-            i += 1
-            self.raster_divide(opt_from_val, min_val, f"ras_min2_{i}", f"ras_min3_{i}", ras_temp_path, min_ras=True)
-            self.raster_divide(opt_to_val, max_val, f"ras_max2_{i}", f"ras_max3_{i}", ras_temp_path, min_ras=False)
-
-        # Second set of condition checks on normalized rasters
-        self.raster_condition_init(num_rows, "ras_min3_", "ras_min4_", "ras_max3_", "ras_max4_", ras_temp_path, ">", "1")
-
-        # Combine minimum and maximum values across rasters
-        for j in range(num_rows):
-            j += 1
-            with rasterio.open(f"{ras_temp_path}ras_min4_{j}") as ras_min4, rasterio.open(f"{ras_temp_path}ras_max4_{j}") as ras_max4:
-                min_data = ras_min4.read(1)
-                max_data = ras_max4.read(1)
-                combined = np.minimum(min_data, max_data)
-                with rasterio.open(f"{ras_temp_path}ras_MnMx_{j}", 'w', **ras_min4.meta) as out_raster:
-                    out_raster.write(combined, 1)
-
-                # Prepare files for combination
-        ras_temp_file, n_ras = self.set_combine_file(in_raster, ras_temp_path)
+        # Prepare files for combination
+        ras_temp_file, n_ras = self.set_combine_file(rows)
 
         if n_ras == 0:
             raise ValueError("n_ras is zero, cannot proceed. Check your inputs.")
 
-        out_ras_temp = None
-        meta = None
-        max_raster_files = []  # List to store paths to maximum rasters
-
-        # First, process single rasters (len(item) == 1)
-        for item in ras_temp_file:
-            if len(item) == 1:
-                item = [f for f in item if f not in ('yes', 'no')]
-                if not item:
-                    continue
-                f = item[0]
-                with rasterio.open(f) as raster:
-                    # Read only the first band (assuming a single-band raster)
-                    data = raster.read(1)
-                    if meta is None:
-                        meta = raster.meta
-                    if out_ras_temp is None:
-                        out_ras_temp = data
-                    else:
-                        out_ras_temp *= data  # Multiply pixel values
-
-        # Next, process groups of rasters (len(item) > 1)
-        n = 0
-        for item in ras_temp_file:
-            if len(item) > 1:
-                n += 1
-                item = [f for f in item if f not in ('yes', 'no')]
-                if not item:
-                    continue
-
-                # Open the first raster to use as a reference for shape
-                with rasterio.open(item[0]) as ref_raster:
-                    ref_shape = ref_raster.shape
-                    ref_meta = ref_raster.meta
-
-                # List to store the resampled rasters
-                resampled_rasters = []
-
-                # Resample rasters if needed
-                for f in item:
-                    with rasterio.open(f) as raster:
-                        if raster.shape != ref_shape:
-                            # Resample to match the reference raster
-                            resampled_data, _ = resample_raster_to_match(f, ref_raster)
-                            resampled_rasters.append(resampled_data)
-                        else:
-                            # Ensure you only read the first band of the raster
-                            resampled_rasters.append(raster.read(1))
-
-                # Perform the maximum operation across the resampled rasters
-                max_data = np.maximum.reduce(resampled_rasters)
-
-                # Save max_data to a temporary raster file
-                max_raster_path = f"{ras_temp_path}rs_MxStat_{n}.tif"
-                if meta is None:
-                    meta = ref_meta
-                with rasterio.open(max_raster_path, 'w', **meta) as out_raster:
-                    out_raster.write(max_data, 1)
-                
-                # Append the file path to max_raster_files
-                max_raster_files.append(max_raster_path)
-
-        # Multiply out_ras_temp by each of the maximum rasters
-        for f in max_raster_files:
-            with rasterio.open(f) as raster:
-                data = raster.read(1)
-                if out_ras_temp is None:
-                    out_ras_temp = data
-                else:
-                    out_ras_temp *= data
-
-        if out_ras_temp is None:
-            raise ValueError("No valid raster data found for combination.")
-
-        # Save the final output raster
-        with rasterio.open(f"{ras_temp_path}final_output.tif", 'w', **meta) as out_raster:
-            out_raster.write(out_ras_temp, 1)
-        # Normalize the combined raster
-        out_ras_temp = out_ras_temp.astype(np.float32)
-        out_ras_temp **= (1 / float(n_ras))
-        with rasterio.open(out_ras_path, 'w', **meta) as out_raster:
-            out_raster.write(out_ras_temp, 1)
-
-        # Save final output
-        output_path = f'{ras_temp_path}Suitability_{ts}.tif'
-        output_path_un = f'{ras_temp_path}Suitability_{ts}_un.tif'
-        with rasterio.open(out_ras_path) as src:
-            with rasterio.open(output_path_un, 'w', **src.meta) as dst:
-                dst.write(src.read(1), 1)
+        # The combined (unclassified) suitability is written once, straight to its final name
+        output_path = os.path.join(ras_temp_path, f'Suitability_{ts}.tif')
+        output_path_un = os.path.join(ras_temp_path, f'Suitability_{ts}_un.tif')
+        self.combine_normalized(ras_temp_file, n_ras, output_path_un)
 
         # Reclassify the output raster
         reclassify(output_path_un, output_path)
+
+        # Overviews let previews read a downsampled copy instead of full resolution; the output
+        # holds class codes, so they are resampled by mode rather than averaged
+        with rasterio.open(output_path, 'r+') as dst:
+            factors = [f for f in OVERVIEW_FACTORS if min(dst.width, dst.height) // f > 0]
+            if factors:
+                dst.build_overviews(factors, Resampling.mode)
+                dst.update_tags(ns='rio_overview', resampling='mode')
         relative_output_path = os.path.relpath(output_path, media_dir)
         relative_output_path = relative_output_path.replace("\\", "/")
         result_relative_url = f"/media/{relative_output_path}"
         
         return result_relative_url
    
-    def raster_minus_init(self, in_raster, ras_max_min, ras_temp_path, in_fc, extent):
-        """Initialize raster subtraction for each input raster and optionally mask them to the AOI extent."""
+    def raster_normalize_init(self, rows, in_fc, extent):
+        """Normalize each input raster into ras_MnMx_{i}, optionally masked to the AOI extent."""
+        tasks = []
+        # AOI extent per raster CRS; inputs usually share one or two CRSs
+        extent_cache = {}
         i = 0
-        valid_rasters = 0
-        for ras_file, min_val, max_val, opt_from_val, opt_to_val, ras_combine, row_count in self.get_row_value(in_raster, ras_max_min):
+        for ras_file, min_val, max_val, opt_from_val, opt_to_val, ras_combine in rows:
             i += 1
-            print(f"Raster minus init for file: {ras_file}")
+            print(f"Raster normalize init for file: {ras_file}")
+            out_path = self._temp_raster(f"ras_MnMx_{i}")
+            aoi_bounds = None
             if extent is not None:
                 with rasterio.open(ras_file) as src:
-                    # Transform the extent to the CRS of the raster
-                    transformer = Transformer.from_crs("EPSG:4326", src.crs.to_string(), always_xy=True)
-                    extent_transformed = transformer.transform_bounds(extent[0], extent[1], extent[2], extent[3])
+                    crs = src.crs.to_string()
                     raster_bounds = src.bounds
-                    print(f"Raster bounds: {raster_bounds}")
-                    if not self.bounds_intersect(raster_bounds, extent_transformed):
-                        print(f"Raster {ras_file} does not intersect with AOI. Skipping masking.")
-                        # Use full raster if no intersection
-                        valid_rasters += 1
-                        self.raster_minus(ras_file, min_val, f"ras_min1_{i}", ras_temp_path, min_ras=True)
-                        self.raster_minus(ras_file, max_val, f"ras_max1_{i}", ras_temp_path, min_ras=False)
-                        continue
-
-                    try:
-                        out_image, out_transform = rasterio.mask.mask(src, [box(*extent_transformed)], crop=True)
-                        out_meta = src.meta
-                        out_meta.update({"driver": "GTiff", "height": out_image.shape[1], "width": out_image.shape[2], "transform": out_transform, "nodata": np.nan})
-                        with rasterio.open(f"{ras_temp_path}ras_mask1_{i}", "w", **out_meta) as dest:
-                            dest.write(out_image)
-
-                        self.raster_minus(f"{ras_temp_path}ras_mask1_{i}", min_val, f"ras_min1_{i}", ras_temp_path, min_ras=True)
-                        self.raster_minus(f"{ras_temp_path}ras_mask1_{i}", max_val, f"ras_max1_{i}", ras_temp_path, min_ras=False)
-                        os.remove(f"{ras_temp_path}ras_mask1_{i}")
-                        valid_rasters += 1
-                    except ValueError as e:
-                        print(f"Skipping masking for raster {ras_file} due to error: {e}")
-                        # Use full raster if masking fails
-                        self.raster_minus(ras_file, min_val, f"ras_min1_{i}", ras_temp_path, min_ras=True)
-                        self.raster_minus(ras_file, max_val, f"ras_max1_{i}", ras_temp_path, min_ras=False)
-                        valid_rasters += 1
-            else:
-                self.raster_minus(ras_file, min_val, f"ras_min1_{i}", ras_temp_path, min_ras=True)
-                self.raster_minus(ras_file, max_val, f"ras_max1_{i}", ras_temp_path, min_ras=False)
-                valid_rasters += 1
+                if crs not in extent_cache:
+                    # Transform the extent to the CRS of the raster
+                    transformer = _transformer("EPSG:4326", crs)
+                    extent_cache[crs] = transformer.transform_bounds(extent[0], extent[1], extent[2], extent[3])
+                extent_transformed = extent_cache[crs]
+                print(f"Raster bounds: {raster_bounds}")
+                if self.bounds_intersect(raster_bounds, extent_transformed):
+                    aoi_bounds = extent_transformed
+                else:
+                    # Use full raster if no intersection
+                    print(f"Raster {ras_file} does not intersect with AOI. Skipping masking.")
+
+            tasks.append((ras_file, min_val, opt_from_val, opt_to_val, max_val, out_path, aoi_bounds))
+
+        # Rasters are independent: GDAL IO and the kernel both release the GIL, so threads overlap them
+        with ThreadPoolExecutor(max_workers=max(1, min(NORMALIZE_WORKERS, len(tasks)))) as executor:
+            valid_rasters = sum(executor.map(partial(self.in_gdal_env, self._normalize_one), tasks))
 
         return valid_rasters
 
-    def raster_minus(self, ras_file, val, ras_output, ras_temp_path, min_ras):
-        """Subtract a value from raster data or vice versa based on the min_ras flag."""
+    @staticmethod
+    def in_gdal_env(func, *args):
+        """Call func(*args) inside GDAL_ENV; rasterio.Env is per thread, so pool workers enter it themselves."""
+        with rasterio.Env(**GDAL_ENV):
+            return func(*args)
+
+    def _normalize_one(self, task):
+        """Normalize one raster, falling back to the full extent if AOI masking fails."""
+        ras_file, min_val, opt_from_val, opt_to_val, max_val, out_path, aoi_bounds = task
+        try:
+            self._normalize_raster(ras_file, min_val, opt_from_val, opt_to_val, max_val, out_path, aoi_bounds)
+        except (ValueError, WindowError) as e:
+            if aoi_bounds is None:
+                raise
+            print(f"Skipping masking for raster {ras_file} due to error: {e}")
+            # Use full raster if masking fails
+            self._normalize_raster(ras_file, min_val, opt_from_val, opt_to_val, max_val, out_path)
+        return 1
+
+    def _temp_raster(self, name):
+        """Path of a new in-memory GeoTIFF for an intermediate raster."""
+        memfile = MemoryFile(filename=f"{name}.tif")
+        self._memfiles[name] = memfile
+        return memfile.name
+
+    def _normalize_raster(self, ras_file, min_val, opt_from, opt_to, max_val, out_path, aoi_bounds=None):
+        """Scale a raster to 0..1 against its min/optimal/max values and write it in a single pass.
+
+        Equivalent to the former minus -> clamp at 0 -> divide -> clamp at 1 chain on both
+        the min and max side, followed by the pixel-wise minimum of the two.
+        """
         with rasterio.open(ras_file) as src:
-            data = src.read(1)
-            if min_ras:
-                data = data - float(val)
-            else:
-                data = float(val) - data
-            with rasterio.open(f"{ras_temp_path}{ras_output}", 'w', **src.meta) as out_raster:
-                out_raster.write(data, 1)
-
-    def raster_divide(self, val1, val2, ras_input, ras_output, ras_temp_path, min_ras):
-        """Divide raster data by a value to normalize it."""
-        with rasterio.open(f"{ras_temp_path}{ras_input}") as src:
-            data = src.read(1)
-            if min_ras:
-                data = data / (float(val1) - float(val2))
+            profile = src.profile.copy()
+            if aoi_bounds is not None:
+                # The AOI is an axis-aligned box, so cropping is a plain window read: no mask to rasterize
+                crop = from_bounds(*aoi_bounds, transform=src.transform).round_offsets().round_lengths()
+                crop = crop.intersection(Window(0, 0, src.width, src.height))
+                profile.update({"height": crop.height, "width": crop.width, "transform": src.window_transform(crop), "nodata": np.nan})
             else:
-                data = data / (float(val2) - float(val1))
-            with rasterio.open(f"{ras_temp_path}{ras_output}", 'w', **src.meta) as out_raster:
-                out_raster.write(data, 1)
+                crop = Window(0, 0, src.width, src.height)
+            profile.update(WRITE_PROFILE)
+
+            # One flat buffer reused for every block; full blocks view all of it, edge blocks a prefix
+            buf = np.empty(BLOCK_SIZE * BLOCK_SIZE, dtype=np.float32)
+            with rasterio.open(out_path, 'w', **profile) as out_raster:
+                for _, window in out_raster.block_windows(1):
+                    data = buf[:window.height * window.width].reshape(window.height, window.width)
+                    src_window = Window(crop.col_off + window.col_off, crop.row_off + window.row_off, window.width, window.height)
+                    src.read(1, window=src_window, out=data)
+                    suitability_kernel(data, min_val, opt_from, opt_to, max_val, data)
+                    out_raster.write(data, 1, window=window)
+
+    def combine_normalized(self, ras_temp_file, n_ras, out_path):
+        """Multiply single rasters with the per-group maximum of combined rasters, block by block,
+        and write the n_ras-th root of the product to out_path.
+        """
+        singles = [item[0] for item in ras_temp_file if len(item) == 1]
+        groups = [item for item in ras_temp_file if len(item) > 1]
+        if not singles and not groups:
+            raise ValueError("No valid raster data found for combination.")
 
-    def raster_condition_init(self, num_rows, ras_name1, ras_name2, ras_name3, ras_name4, ras_temp_path, condition, threshold):
-        """Initialize condition checks on raster data for a specified condition and threshold."""
-        for i in range(num_rows):
-            i += 1
-            self.raster_condition(f"{ras_temp_path}{ras_name1}{i}", f"{ras_temp_path}{ras_name2}{i}", condition, threshold)
-            self.raster_condition(f"{ras_temp_path}{ras_name3}{i}", f"{ras_temp_path}{ras_name4}{i}", condition, threshold)
-
-    def raster_condition(self, ras_input, ras_output, condition, threshold):
-        """Apply a condition to raster data, replacing values that meet the condition with the threshold."""
-        with rasterio.open(ras_input) as src:
-            data = src.read(1)
-            data = np.where(eval(f"data {condition} {threshold}"), float(threshold), data)
-            with rasterio.open(ras_output, 'w', **src.meta) as out_raster:
-                out_raster.write(data, 1)
-
-    def set_combine_file1(self, in_raster, ras_temp_path):
+        with ExitStack() as stack:
+            # The first single raster (or the first raster of the first group) defines the output grid
+            ref = stack.enter_context(rasterio.open(singles[0] if singles else groups[0][0]))
+            profile = ref.profile.copy()
+            profile.update(WRITE_PROFILE)
+
+            single_srcs = [stack.enter_context(rasterio.open(f)) for f in singles]
+            # Group members are read through a bilinear WarpedVRT on the reference grid, so
+            # mismatched rasters are resampled lazily, one window at a time
+            group_srcs = []
+            for item in groups:
+                members = []
+                for f in item:
+                    src = stack.enter_context(rasterio.open(f))
+                    members.append(stack.enter_context(WarpedVRT(
+                        src, crs=ref.crs, transform=ref.transform, width=ref.width, height=ref.height,
+                        resampling=Resampling.bilinear)))
+                group_srcs.append(members)
+
+            root_out = stack.enter_context(rasterio.open(out_path, 'w', **profile))
+            # Each group owns its datasets, so groups can be read and reduced on separate threads
+            executor = stack.enter_context(ThreadPoolExecutor(max_workers=max(1, min(NORMALIZE_WORKERS, len(group_srcs)))))
+
+            # The n_ras-th root of the product is accumulated as a sum of logs, so each pixel
+            # costs one exp at the end instead of n multiplies and a pow
+            inv_n = np.float32(1 / float(n_ras))
+            log_buf = np.empty(BLOCK_SIZE * BLOCK_SIZE, dtype=np.float32)
+            for _, window in root_out.block_windows(1):
+                acc = log_buf[:window.height * window.width].reshape(window.height, window.width)
+                acc.fill(0)
+                for src in single_srcs:
+                    add_log(src.read(1, window=window, out_dtype=np.float32), acc)
+
+                for max_data in executor.map(partial(self.in_gdal_env, _group_max), group_srcs, [window] * len(group_srcs)):
+                    add_log(max_data, acc)
+
+                # Normalize the combined raster
+                exp_mean(acc, inv_n, acc)
+                root_out.write(acc, 1, window=window)
+
+    def bounds_intersect(self, bounds1, bounds2):
+        """Check if two bounding boxes intersect."""
+        return not (bounds1[0] > bounds2[2] or bounds1[2] < bounds2[0] or bounds1[1] > bounds2[3] or bounds1[3] < bounds2[1])
+
+    def set_combine_file1(self, rows, ras_temp_path):
         """Build a list with paths of temporary raster files based on the combine parameter."""
         ras_temp_file = []
         n_ras = 0
         
         row_count = 0
-        for _, min_val, max_val, opt_from_val, opt_to_val, ras_combine, row_count in self.get_row_value(in_raster, ras_max_min=True):
+        for _, min_val, max_val, opt_from_val, opt_to_val, ras_combine in rows:
             row_count += 1
-            temp_file = [f"{ras_temp_path}ras_MnMx_{row_count}"]
+            temp_file = [os.path.join(ras_temp_path, f"ras_MnMx_{row_count}")]
             
             if ras_combine.lower() == 'yes':
                 temp_file.append('yes')
@@ -336,20 +356,17 @@ class LandSuitability(TargetingTool):
         return ras_temp_file, n_ras
     
 
-    def set_combine_file(self, in_raster, ras_temp_path):
+    def set_combine_file(self, rows):
         """Build a list with lists of temporary raster files based on the combine parameter."""
         ras_temp_file = []  # List to hold groups of raster temp file paths
         current_group = []  # Current group of rasters
         n_ras = 0  # Total number of rasters
 
-        # Retrieve the raster entries as a list
-        rasters = list(self.get_row_value(in_raster, ras_max_min=True))
-
-        for index, (ras_file, min_val, max_val, opt_from_val, opt_to_val, ras_combine, row_count) in enumerate(rasters):
+        for index, (ras_file, min_val, max_val, opt_from_val, opt_to_val, ras_combine) in enumerate(rows):
             n_ras += 1  # Increment raster count
 
             # Create temporary file path for the raster
-            temp_file_path = f"{ras_temp_path}ras_MnMx_{n_ras}"
+            temp_file_path = self._memfiles[f"ras_MnMx_{n_ras}"].name
 
             # Ensure the combine parameter is in lowercase
             ras_combine = ras_combine.lower()
@@ -380,7 +397,6 @@ class LandSuitability(TargetingTool):
     def get_row_value(self, in_raster, ras_max_min):
         """Generator to yield values for each row in the value table."""
         for item in in_raster.values():
-            row_count = 0
             ras_file = item['url']
             min_val = item['min_val']
             opt_from_val = item['opti_from']
@@ -392,12 +408,12 @@ class LandSuitability(TargetingTool):
                 ras_combine = 'no'
 
             if ras_max_min:
-                min_val = float(min_val)
-                opt_from_val = float(opt_from_val)
-                opt_to_val = float(opt_to_val)
-                max_val = float(max_val)
-            row_count += 1
-            yield ras_file, min_val, max_val, opt_from_val, opt_to_val, ras_combine, row_count
+                # float32 scalars keep the normalization arithmetic in single precision
+                min_val = np.float32(min_val)
+                opt_from_val = np.float32(opt_from_val)
+                opt_to_val = np.float32(opt_to_val)
+                max_val = np.float32(max_val)
+            yield ras_file, min_val, max_val, opt_from_val, opt_to_val, ras_combine
 
     def get_extent_from_aoi(self, aoi_str):
         """Convert an AOI string to a GeoDataFrame."""
@@ -405,36 +421,3 @@ class LandSuitability(TargetingTool):
         polygon = box(coords[1], coords[0], coords[3], coords[2])
         gdf = gpd.GeoDataFrame({"geometry": [polygon]}, crs="EPSG:4326")
         return gdf
-    
-
-
-def resample_raster_to_match(src_raster, target_raster):
-    """Resamples src_raster to match the target_raster's shape and transform."""
-    with rasterio.open(src_raster) as src:
-        # Get metadata from the target raster
-        target_transform = target_raster.transform
-        target_width = target_raster.width
-        target_height = target_raster.height
-        target_crs = target_raster.crs
-
-        # Update metadata to match the target raster
-        kwargs = src.meta.copy()
-        kwargs.update({
-            'crs': target_crs,
-            'transform': target_transform,
-            'width': target_width,
-            'height': target_height
-        })
-
-        # Resample raster data to match the target
-        data = src.read(
-            out_shape=(src.count, target_height, target_width),
-            resampling=Resampling.bilinear
-        )
-
-        return data[0], kwargs  # Return the first band and updated metadata
-
-
-    def bounds_intersect(self, bounds1, bounds2):
-        """Check if two bounding boxes intersect."""
-        return not (bounds1[0] > bounds2[2] or bounds1[2] < bounds2[0] or bounds1[1] > bounds2[3] or bounds1[3] < bounds2[1])
\ No newline at end of file
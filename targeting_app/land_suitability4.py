@@ -4,19 +4,23 @@ import numpy as np
 import time
 import re
 import rasterio
-import rasterio.mask
-import threading
 from shapely.geometry import  shape, Polygon,MultiPolygon, box
 from collections import OrderedDict
-from shapely.ops import transform as shapely_transform
+from shapely.prepared import prep
 import json
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pyproj import Transformer
 from rasterio.enums import Resampling
+from rasterio.features import geometry_mask, geometry_window
+from rasterio.vrt import WarpedVRT
+from rasterio.windows import Window
 from django.utils.timezone import now
 from .reclassify1 import reclassify
+from ._kernels import dequantize, masked_maximum, masked_multiply, minmax_valid, quantize, trapezoid_kernel
 from .main_tool import TargetingTool
 from pathlib import Path
+from contextlib import ExitStack
+from functools import lru_cache
 import shutil
 
 # Configure logging
@@ -29,27 +33,65 @@ logging.basicConfig(
     ]
 )
 
-def wait_for_valid_raster(path, tries=50, sleep=0.1):
-    """
-    Wait until a raster exists AND can be opened by rasterio.
-    Prevents race conditions in threaded workflows.
-    """
-    for _ in range(tries):
-        if os.path.exists(path) and os.path.getsize(path) > 0:
-            try:
-                with rasterio.open(path):
-                    return True
-            except Exception:
-                pass
-        time.sleep(sleep)
-    return False
-        
-   
+# GDAL warp settings for aligning and resampling rasters: all cores, 512 MB working buffer
+WARP_THREADS = os.cpu_count() or 1
+WARP_MEM_LIMIT = 512
+
+# Edge of the square tiles rasters are processed in, and of the internal tiles of the
+# intermediate GeoTIFFs, so each window read or written is a single block. Intermediates
+# are read back once and deleted, so they are left uncompressed: each window read is a
+# straight copy of one block, with no decode
+TILE_SIZE = 512
+WRITE_PROFILE = {
+    "driver": "GTiff", "count": 1, "dtype": "float32",
+    "tiled": True, "blockxsize": TILE_SIZE, "blockysize": TILE_SIZE,
+    "bigtiff": "IF_SAFER",
+}
+
+# GDAL settings for a run: a 1 GB block cache shared by the windowed reads, multi-threaded
+# decoding and warping, and no free-space probe before each intermediate is created
+GDAL_ENV = {
+    "GDAL_CACHEMAX": 1024,
+    "GDAL_NUM_THREADS": "ALL_CPUS",
+    "CPL_VSIL_CURL_CACHE_SIZE": 256 * 1024 * 1024,
+    "CHECK_DISK_FREE_SPACE": "NO",
+}
+
+# normalized_*.tif hold suitability scores in [0, 1] as int16 round(score * SCORE_SCALE):
+# four decimal places at half the size of float32
+SCORE_SCALE = 10000
+
+# Overview levels built on the final classified raster
+OVERVIEW_FACTORS = (2, 4, 8, 16, 32)
+
+
+@lru_cache(maxsize=32)
+def _transformer(src_crs, dst_crs):
+    """Shared pyproj Transformer per CRS pair; building one costs milliseconds."""
+    return Transformer.from_crs(src_crs, dst_crs, always_xy=True)
+
+
+def _transform_ring(transformer, ring):
+    """Coordinates of a ring transformed as one array, as an (n, 2) array."""
+    coords = np.asarray(ring.coords)
+    return np.column_stack(transformer.transform(coords[:, 0], coords[:, 1]))
+
+
+def _transform_polygon(transformer, polygon):
+    """Polygon with its exterior and interior rings transformed."""
+    return Polygon(
+        _transform_ring(transformer, polygon.exterior),
+        [_transform_ring(transformer, ring) for ring in polygon.interiors],
+    )
+
+
+def tile_view(buf, window):
+    """View of the flat preallocated buffer buf shaped to window."""
+    return buf[:window.height * window.width].reshape(window.height, window.width)
+
 class LandSuitability(TargetingTool):
     """Tool for determining land suitability based on raster data and user-defined criteria."""
 
-    ref_raster_lock = threading.Lock()
-
     def __init__(self, parameters,session):
         """Initialize the tool with user-defined parameters."""
         super().__init__()
@@ -60,6 +102,9 @@ class LandSuitability(TargetingTool):
         self.canRunInBackground = False
         self.parameters = parameters
         self.session = session
+        # Grid every input is aligned to; set by the scheduler from the first raster to finish
+        # loading, before any normalization task is submitted
+        self.ref_profile = None
         logging.debug("LandSuitability initialized with parameters: %s", parameters)
 
     def prepare_value_table(self, parameters):
@@ -100,6 +145,11 @@ class LandSuitability(TargetingTool):
 
     def execute(self):
         """Main workflow to process rasters and determine suitability."""
+        with rasterio.Env(**GDAL_ENV):
+            return self._execute()
+
+    def _execute(self):
+        """Body of execute, run inside the GDAL environment."""
         try:
             logging.info("Execution started.")
             in_raster = self.prepare_value_table(self.parameters)
@@ -132,12 +182,12 @@ class LandSuitability(TargetingTool):
                 raise ValueError("No valid rasters intersect the AOI. Check your inputs.")
 
             # Combine grouped rasters based on combine parameter
-            combined_raster = self.combine_rasters(in_raster, ras_temp_path)
+            combined_path, value_range = self.combine_rasters(in_raster, ras_temp_path)
 
             desc = self.parameters.get("description", None)
 
             # Save and output final result
-            final_output = self.save_output(combined_raster, ras_temp_path,raster_base_path,desc)
+            final_output = self.save_output(combined_path, ras_temp_path,raster_base_path,desc, value_range)
             logging.info("Execution completed successfully. Output: %s", final_output)
             return final_output
 
@@ -169,61 +219,119 @@ class LandSuitability(TargetingTool):
         logging.debug("Processing rasters with AOI: %s", aoi_input)
         aoi = self.get_extent_from_aoi(aoi_input) if aoi_input else None
         valid_rasters = 0
+
+        # This thread only schedules and does the bookkeeping/logging; the pool runs the warp,
+        # mask and kernel steps, which spend their time outside the GIL
         with ThreadPoolExecutor() as executor:
-            futures = [
-                executor.submit(self.process_single_raster, idx, params, ras_temp_path, aoi)
-                for idx, params in in_raster.items()
-            ]
-            results = [f.result() for f in futures]
-            valid_rasters = sum(results)
+            loads = {}
+            for idx, params in in_raster.items():
+                logging.debug("Processing raster: %s", params)
+                try:
+                    thresholds = self.parse_thresholds(params)
+                except (KeyError, ValueError) as e:
+                    logging.error("[ERROR] ValueError while processing raster: %s", e, exc_info=True)
+                    continue
+                future = executor.submit(self.in_gdal_env, self.inspect_raster, params["url"], aoi)
+                loads[future] = (idx, params, thresholds)
+
+            saves = {}
+            for future in as_completed(loads):
+                idx, params, thresholds = loads[future]
+                inspected = self.raster_task_result(future, params)
+                if inspected is None:
+                    continue
+
+                if self.ref_profile is None:
+                    # The first raster to be inspected defines the reference grid; its AOI is
+                    # already in the reference CRS
+                    grid, aoi_transformed = inspected
+                    self.ref_profile = dict(grid, aoi=aoi_transformed)
+                    logging.debug("Reference grid set from raster: %s", params["url"])
+
+                future = executor.submit(
+                    self.in_gdal_env, self.normalize_raster, idx, params["url"], thresholds, ras_temp_path
+                )
+                saves[future] = (params, thresholds)
+
+            for future in as_completed(saves):
+                params, (user_min_val, _, _, user_max_val) = saves[future]
+                result = self.raster_task_result(future, params)
+                if result is None:
+                    continue
+                output_path, actual_min, actual_max = result
+                if output_path is None:
+                    logging.warning("No valid data in raster after masking/alignment. Skipping suitability computation.")
+                    continue
+
+                # Optional: log raster range vs user thresholds (do NOT clamp user thresholds)
+                if actual_min > user_min_val or actual_max < user_max_val:
+                    logging.warning(
+                        "Raster value range [%f, %f] is narrower than user thresholds [%f, %f]. "
+                        "Suitability will be computed using user thresholds (no clamping).",
+                        actual_min, actual_max, user_min_val, user_max_val
+                    )
+                logging.info("Processed raster saved: %s", output_path)
+                valid_rasters += 1
+
         logging.info("Processed %d valid rasters.", valid_rasters)
         return valid_rasters
 
-    def align_to_reference(self, data, transform, src_crs,ref_raster_path):
-        """
-        Align the masked raster to the reference raster.
+    @staticmethod
+    def in_gdal_env(func, *args):
+        """Call func(*args) inside GDAL_ENV; rasterio.Env is per thread, so pool workers enter it themselves."""
+        with rasterio.Env(**GDAL_ENV):
+            return func(*args)
 
-        Parameters:
-            data (np.ndarray): The raster data to align.
-            transform (Affine): The affine transform of the input raster.
-            ref_raster_path (str): Path to the reference raster for alignment.
+    @staticmethod
+    def parse_thresholds(params):
+        """
+        Parse and validate (min_val, opti_from, opti_to, max_val) for one raster.
 
-        Returns:
-            tuple: (aligned_data, aligned_transform) where aligned_data is the raster
-                   aligned to the reference grid and aligned_transform is the affine transform.
+        Raises:
+            ValueError: If the thresholds are not ordered min <= opti_from <= opti_to <= max.
         """
-        with rasterio.open(ref_raster_path) as ref:
-            ref_transform = ref.transform
-            ref_crs = ref.crs
-            ref_width = ref.width
-            ref_height = ref.height
-
-            aligned_data = np.empty((ref_height, ref_width), dtype=data.dtype)
-            rasterio.warp.reproject(
-                source=data,
-                destination=aligned_data,
-                src_transform=transform,
-                dst_transform=ref_transform,
-                src_crs=src_crs,
-                dst_crs=ref_crs,
-                src_nodata=-32768,
-                dst_nodata=-32768,
-                resampling=rasterio.warp.Resampling.nearest,
+        user_min_val = float(params["min_val"])
+        user_max_val = float(params["max_val"])
+        opt_from = float(params["opti_from"])
+        opt_to = float(params["opti_to"])
+
+        # Validate thresholds (expected: min_val <= opti_from <= opti_to <= max_val)
+        if not (user_min_val <= opt_from <= opt_to <= user_max_val):
+            raise ValueError(
+                "Invalid suitability thresholds: require min_val <= opti_from <= opti_to <= max_val; "
+                f"got min={user_min_val}, opt_from={opt_from}, opt_to={opt_to}, max={user_max_val}"
             )
-            return aligned_data, ref_transform
-        
+        return user_min_val, opt_from, opt_to, user_max_val
 
+    @staticmethod
+    def raster_task_result(future, params):
+        """Result of a per-raster task, or None after logging why it failed."""
+        try:
+            return future.result()
+        except FileNotFoundError:
+            logging.error("[ERROR] File not found: %s", params["url"], exc_info=True)
+        except PermissionError:
+            logging.error("[ERROR] Permission denied when accessing raster: %s", params["url"], exc_info=True)
+        except rasterio.errors.RasterioError as e:
+            logging.error("[ERROR] Rasterio processing error: %s", e, exc_info=True)
+        except ValueError as e:
+            logging.error("[ERROR] ValueError while processing raster: %s", e, exc_info=True)
+        except Exception as e:
+            logging.error("[ERROR] Unexpected error while processing raster: %s", e, exc_info=True)
+        return None
 
     def combine_rasters(self, in_raster, ras_temp_path):
         """
-        Combine grouped normalized rasters based on the combine parameter.
+        Combine grouped normalized rasters based on the combine parameter, tile by tile.
 
         Parameters:
             in_raster (OrderedDict): Table of raster inputs.
             ras_temp_path (str): Path for temporary storage.
 
         Returns:
-            np.array: Combined raster data with NoData values properly masked.
+            tuple: (output_path, value_range), where output_path is the combined float32 raster
+                   (NoData pixels hold NO_DATA_VALUE) and value_range is (min, max) of its
+                   valid pixels, or None if it has none.
         """
         NO_DATA_VALUE = -32768  # NoData value (should be ignored in computations)
 
@@ -233,250 +341,245 @@ class LandSuitability(TargetingTool):
             logging.error("No rasters available for combination.")
             raise ValueError("No rasters available for combination.")
 
-        combined_data = None
-        reference_meta = None  # Initialize reference metadata
+        nodata = np.float32(NO_DATA_VALUE)
+        inv_scale = np.float32(1.0 / SCORE_SCALE)
+        output_path = os.path.join(ras_temp_path, "final_output.tif")
         logging.debug("Combining rasters: %s", ras_temp_file)
 
-        try:
-            for group in ras_temp_file:
-                if len(group) == 1:
-                    raster_path = group[0]
-                    with rasterio.open(raster_path) as src:
-                        if reference_meta is None:
-                            # Set the metadata of the first raster as reference
-                            reference_meta = src.meta.copy()
-                            logging.debug("Reference metadata set: %s", reference_meta)
-
-                        data = src.read(1,masked=True)  # Read as numpy array
-                        masked_data = np.ma.masked_equal(data, NO_DATA_VALUE)  # Mask out NoData values
-
-                        if combined_data is None:
-                            combined_data = masked_data
-                        else:
-                            combined_data = combined_data * masked_data  # Perform element-wise multiplication
+        # Set the metadata of the first raster as reference
+        with rasterio.open(ras_temp_file[0][0]) as src:
+            reference_meta = src.meta.copy()
+        logging.debug("Reference metadata set: %s", reference_meta)
 
-                else:
-                    group_data = None
+        try:
+            with ExitStack() as stack:
+                # Open every source once; group members are read through a resampling view
+                # of the reference grid rather than written out as aligned copies
+                groups = []
+                for group in ras_temp_file:
+                    members = []
                     for raster_path in group:
-                        # Ensure `reference_meta` is set before resampling
-                        if reference_meta is None:
-                            with rasterio.open(raster_path) as src:
-                                reference_meta = src.meta.copy()
-                                logging.debug("Reference metadata set: %s", reference_meta)
-
-                        aligned_path = os.path.join(ras_temp_path, f"aligned_{os.path.basename(raster_path)}")
-                        self.resample_raster(raster_path, reference_meta, aligned_path)
-
-                        with rasterio.open(aligned_path) as aligned_src:
-                            data = aligned_src.read(1)  # Read as numpy array
-                            masked_data = np.ma.masked_equal(data, NO_DATA_VALUE)  # Mask out NoData values
-
-                            if group_data is None:
-                                group_data = masked_data
-                            else:
-                                group_data = np.ma.maximum(group_data, masked_data)  # Element-wise max
-
-                    if combined_data is None:
-                        combined_data = group_data
-                    else:
-                        combined_data = combined_data * group_data  # Perform element-wise multiplication
-
-            # Fill masked (NoData) values with NO_DATA_VALUE before returning
-            combined_data = np.ma.filled(combined_data, NO_DATA_VALUE)
+                        src = stack.enter_context(rasterio.open(raster_path))
+                        if len(group) > 1:
+                            src = stack.enter_context(self.resample_raster(src, reference_meta))
+                        members.append(src)
+                    groups.append(members)
+
+                meta = reference_meta.copy()
+                meta.update(WRITE_PROFILE, nodata=NO_DATA_VALUE)
+                dst = stack.enter_context(rasterio.open(output_path, "w", **meta))
+
+                # One buffer each for the running product, the group maximum and the operand,
+                # allocated once and viewed at each window's shape
+                combined_buf = np.empty(TILE_SIZE * TILE_SIZE, dtype=np.float32)
+                group_buf = np.empty_like(combined_buf)
+                scratch_buf = np.empty_like(combined_buf)
+                value_min, value_max = np.inf, -np.inf
+
+                for _, window in dst.block_windows(1):
+                    combined = tile_view(combined_buf, window)
+                    group_data = tile_view(group_buf, window)
+                    scratch = tile_view(scratch_buf, window)
+
+                    for i, members in enumerate(groups):
+                        target = combined if i == 0 else group_data
+                        members[0].read(1, window=window, out=target)
+                        for src in members[1:]:
+                            src.read(1, window=window, out=scratch)
+                            # Element-wise max; NoData wherever either side is NoData
+                            masked_maximum(target, scratch, nodata)
+                        # Back to [0, 1] scores; the maximum commutes with the scaling, so
+                        # a group is rescaled once rather than per member
+                        dequantize(target, nodata, inv_scale)
+                        if i > 0:
+                            # Element-wise product; NoData wherever either side is NoData
+                            masked_multiply(combined, group_data, nodata)
+
+                    tile_min, tile_max, any_valid = minmax_valid(combined, nodata)
+                    if any_valid:
+                        value_min = min(value_min, float(tile_min))
+                        value_max = max(value_max, float(tile_max))
+                    dst.write(combined, 1, window=window)
 
         except Exception as e:
             logging.error("Error while combining rasters: %s", e, exc_info=True)
             raise
 
-        logging.debug("Combined raster data shape: %s", combined_data.shape if combined_data is not None else None)
-        return combined_data
-
-    
-    
-
+        logging.debug("Combined raster written: %s", output_path)
+        value_range = (value_min, value_max) if value_min <= value_max else None
+        return output_path, value_range
 
+    def inspect_raster(self, raster_path, aoi=None):
+        """
+        Work out the grid a raster covers: its AOI crop window if an AOI is given, else the
+        whole raster. Only metadata is read.
 
+        Runs on a worker thread.
 
-    def process_single_raster(self, idx, params, ras_temp_path, aoi=None):
+        Returns:
+            tuple: (grid, aoi_transformed), where grid has 'transform', 'crs', 'width' and
+                   'height' and aoi_transformed is the AOI in the raster's CRS (or None),
+                   or None if the AOI does not overlap the raster.
+        """
+        with rasterio.open(raster_path) as src:
+            if not aoi:
+                grid = {"transform": src.transform, "crs": src.crs, "width": src.width, "height": src.height}
+                return grid, None
+
+            # Transform AOI to raster CRS and validate overlap
+            aoi_transformed = self.transform_aoi_to_raster_crs(aoi, src.crs)
+            if not self.validate_aoi_overlap(src, aoi_transformed):
+                logging.warning("Skipping raster as AOI does not overlap: %s", raster_path)
+                return None  # Skip processing if no overlap
+
+            # The same window rasterio.mask.mask(crop=True) would crop to
+            window = geometry_window(src, [aoi_transformed])
+            grid = {
+                "transform": src.window_transform(window),
+                "crs": src.crs,
+                "width": int(window.width),
+                "height": int(window.height),
+            }
+        return grid, aoi_transformed
+
+    def normalize_raster(self, idx, raster_path, thresholds, ras_temp_path):
         """
-        Process a single raster, including AOI masking, thresholding, normalization, and alignment.
+        Bring a raster onto the reference grid (warping only if it is not already on it), mask
+        it to the AOI, score it and save normalized_{idx}.tif, one tile at a time.
 
-        Ensures only one thread creates the reference raster to avoid race conditions.
+        Runs on a worker thread; self.ref_profile must already be set.
 
         Parameters:
             idx (int): The index of the raster.
-            params (dict): Parameters for the raster.
+            raster_path (str): Path to the input raster.
+            thresholds (tuple): (min_val, opti_from, opti_to, max_val) from parse_thresholds.
             ras_temp_path (str): Path to the temporary directory for saving outputs.
-            aoi (Polygon, optional): AOI polygon for masking.
 
         Returns:
-            int: 1 if processing succeeds, 0 otherwise.
+            tuple: (output_path, actual_min, actual_max); output_path is None if no valid data
+                   remains after masking/alignment.
         """
-        try:
-            logging.debug("Processing raster: %s", params)
-            raster_path = params["url"]
-            user_min_val = float(params["min_val"])
-            user_max_val = float(params["max_val"])
-            opt_from = float(params["opti_from"])
-            opt_to = float(params["opti_to"])
-
-            NO_DATA_VALUE = -32768  # NoData value
-
-            # Open raster with masked values
-            with rasterio.open(raster_path) as src:
-                logging.debug("Raster opened: %s", raster_path)
-                src_meta = src.meta.copy()
-                transform = src.transform
-                crs = src.crs
-                data = src.read(1, masked=True)  # Read as a masked array (preserves NoData)
-
-                # Extract NoData value from raster
-                no_data_value = src.nodata if src.nodata is not None else NO_DATA_VALUE
-                data = np.ma.masked_equal(data, no_data_value)  # Mask NoData values
-                logging.debug("NoData value replaced with masked array")
-
-                # Convert to float32 for consistency
-                data = data.astype(np.float32)
-
-                # Transform AOI to raster CRS and validate overlap
-                if aoi:
-                    aoi_transformed = self.transform_aoi_to_raster_crs(aoi, crs)
-                    if not self.validate_aoi_overlap(raster_path, aoi_transformed):
-                        logging.warning("Skipping raster as AOI does not overlap: %s", raster_path)
-                        return 0  # Skip processing if no overlap
-
-                    # Apply AOI masking
-                    try:
-                        aoi_polygon = [aoi_transformed.__geo_interface__]
-                        data, transform = rasterio.mask.mask(src, aoi_polygon, crop=True,filled=False)
-                        data = data[0]  # Extract single-band data
-                        data = data.astype(np.float32)
-                        data = np.ma.masked_equal(data, no_data_value)
-                    except ValueError as e:
-                        logging.error("Masking failed for raster %s: %s", raster_path, e)
-                        return 0
-
-            # Handle reference raster creation and alignment
-            ref_raster = os.path.join(ras_temp_path, "aligned_ref.tif")
-
-            if not os.path.exists(ref_raster):
-                with self.__class__.ref_raster_lock:  # Ensure only one thread writes the reference raster
-                    if not os.path.exists(ref_raster):  # Double-check inside lock
-                        logging.debug("Creating reference raster: %s", ref_raster)
-
-                        meta = src_meta.copy()
-                        meta.update({
-                            "driver": "GTiff",
-                            "dtype": "float32",
-                            "count": 1,
-                            "height": data.shape[0],
-                            "width": data.shape[1],
-                            "transform": transform,
-                            "nodata": NO_DATA_VALUE  # Ensure NoData is correctly set
-                        })
-
-                        with rasterio.open(ref_raster, "w", **meta) as ref_dst:
-                            ref_dst.write(data.astype(np.float32).filled(NO_DATA_VALUE), 1)
-                        logging.debug("Reference raster created successfully.")
-
-            # Wait until reference raster exists before continuing
-            if not wait_for_valid_raster(ref_raster):
-                raise RuntimeError(f"Reference raster not readable: {ref_raster}")
-
-            # Align the current raster to the reference
-            data, transform = self.align_to_reference(
-                data.filled(NO_DATA_VALUE),
-                transform,
-                crs,      
-                ref_raster
-            )
-            data = np.ma.masked_equal(data, NO_DATA_VALUE)  # Reapply masking
-
-            # Validate thresholds (expected: min_val <= opti_from <= opti_to <= max_val)
-            if not (user_min_val <= opt_from <= opt_to <= user_max_val):
-                raise ValueError(
-                    "Invalid suitability thresholds: require min_val <= opti_from <= opti_to <= max_val; "
-                    f"got min={user_min_val}, opt_from={opt_from}, opt_to={opt_to}, max={user_max_val}"
-                )
-
-            # Ensure raster has valid data after masking/alignment
-            valid = ~data.mask
-            if not np.any(valid):
-                logging.warning("No valid data in raster after masking/alignment. Skipping suitability computation.")
-                return 0
-
-            # Optional: log raster range vs user thresholds (do NOT clamp user thresholds)
-            valid_vals = data.data[valid]
-            actual_min = float(np.min(valid_vals))
-            actual_max = float(np.max(valid_vals))
-            if actual_min > user_min_val or actual_max < user_max_val:
-                logging.warning(
-                    "Raster value range [%f, %f] is narrower than user thresholds [%f, %f]. "
-                    "Suitability will be computed using user thresholds (no clamping).",
-                    actual_min, actual_max, user_min_val, user_max_val
-                )
+        NO_DATA_VALUE = -32768  # NoData value
+        nodata = np.float32(NO_DATA_VALUE)
+        # Kernel arguments are cast to the data dtype once, not per tile
+        mn, of, ot, mx = (np.float32(t) for t in thresholds)
+        score_scale = np.float32(SCORE_SCALE)
+        ref = self.ref_profile
+        aoi = ref["aoi"]  # AOI in the reference CRS, or None
+        aoi_prepared = prep(aoi) if aoi is not None else None
+
+        output_path = os.path.join(ras_temp_path, f"normalized_{idx}.tif")
+        meta = dict(
+            WRITE_PROFILE,
+            crs=ref["crs"],
+            transform=ref["transform"],
+            width=ref["width"],
+            height=ref["height"],
+            dtype="int16",  # Scores stored as round(score * SCORE_SCALE)
+            nodata=NO_DATA_VALUE,  # Ensure NoData is correctly set
+        )
 
-            # Compute trapezoidal suitability scores in [0, 1]
-            x = data.data  # raw ndarray; use `valid` mask to ignore NoData
-            suitability = np.zeros(x.shape, dtype=np.float32)
-
-            # Optimal plateau: [opt_from, opt_to] => 1
-            plateau = valid & (x >= opt_from) & (x <= opt_to)
-            suitability[plateau] = 1.0
-
-            # Rising edge: (x - min) / (opt_from - min) for (min, opt_from)
-            den_up = (opt_from - user_min_val)
-            if den_up > 0:
-                up = valid & (x > user_min_val) & (x < opt_from)
-                suitability[up] = (x[up] - user_min_val) / den_up
-
-            # Falling edge: (max - x) / (max - opt_to) for (opt_to, max)
-            den_down = (user_max_val - opt_to)
-            if den_down > 0:
-                down = valid & (x > opt_to) & (x < user_max_val)
-                suitability[down] = (user_max_val - x[down]) / den_down
-
-            # Safety clamp
-            suitability = np.clip(suitability, 0.0, 1.0).astype(np.float32)
-
-            # Keep NoData masked
-            normalized = np.ma.masked_array(suitability, mask=data.mask)
-
-            # Save the processed raster
-            output_path = os.path.join(ras_temp_path, f"normalized_{idx}.tif")
-            meta = src_meta.copy()
-            meta.update({
-                "driver": "GTiff",
-                "dtype": "float32",
-                "height": normalized.shape[0],
-                "width": normalized.shape[1],
-                "transform": transform,
-                "nodata": NO_DATA_VALUE  # Ensure NoData is correctly set
-            })
-
-            with rasterio.open(output_path, "w", **meta) as dst:
-                dst.write(normalized.astype(np.float32).filled(NO_DATA_VALUE), 1)  # Preserve NoData
-            logging.info("Processed raster saved: %s", output_path)
-
-            return 1
+        # Tile buffers are allocated once and viewed at each window's shape
+        data_buf = np.empty(TILE_SIZE * TILE_SIZE, dtype=np.float32)
+        normalized_buf = np.empty_like(data_buf)
+        quantized_buf = np.empty(data_buf.shape, dtype=np.int16)
+        mask_buf = np.empty(data_buf.shape, dtype=bool)
+        actual_min, actual_max = np.inf, -np.inf
+
+        with ExitStack() as stack:
+            src = stack.enter_context(rasterio.open(raster_path))
+            # Extract NoData value from raster
+            no_data_value = src.nodata if src.nodata is not None else NO_DATA_VALUE
+            src_nodata = np.float32(no_data_value)
+
+            offset = self.grid_offset(src, ref)
+            if offset is None:
+                # Nearest-neighbour view of the raster on the reference grid; NoData comes out as the sentinel
+                vrt = stack.enter_context(WarpedVRT(
+                    src,
+                    crs=ref["crs"],
+                    transform=ref["transform"],
+                    width=ref["width"],
+                    height=ref["height"],
+                    src_nodata=no_data_value,
+                    nodata=NO_DATA_VALUE,
+                    resampling=Resampling.nearest,
+                    warp_mem_limit=WARP_MEM_LIMIT,
+                    warp_extras={"NUM_THREADS": WARP_THREADS},
+                ))
+            dst = stack.enter_context(rasterio.open(output_path, "w", **meta))
+
+            def read_tile(window, data):
+                """Read one reference-grid window of the raster into data, NoData as the sentinel."""
+                if offset is None:
+                    vrt.read(1, window=window, out=data)
+                    return
+                # Already on the reference grid: plain read, no warp
+                col_off, row_off = offset
+                src.read(1, window=Window(window.col_off + col_off, window.row_off + row_off,
+                                          window.width, window.height), out=data)
+                if np.isnan(src_nodata) or src_nodata != nodata:
+                    missing = tile_view(mask_buf, window)
+                    if np.isnan(src_nodata):
+                        np.isnan(data, out=missing)
+                    else:
+                        np.equal(data, src_nodata, out=missing)
+                    np.copyto(data, nodata, where=missing)
+
+            for _, window in dst.block_windows(1):
+                data = tile_view(data_buf, window)
+                normalized = tile_view(normalized_buf, window)
+                quantized = tile_view(quantized_buf, window)
+
+                # Apply AOI masking. A pixel mask is only rasterized for tiles the AOI
+                # boundary crosses; tiles wholly outside are NoData without being read
+                if aoi is not None:
+                    tile_box = box(*dst.window_bounds(window))
+                    if not aoi_prepared.intersects(tile_box):
+                        quantized.fill(NO_DATA_VALUE)
+                        dst.write(quantized, 1, window=window)
+                        continue
+                    read_tile(window, data)
+                    if not aoi_prepared.contains(tile_box):
+                        outside = geometry_mask([aoi], out_shape=data.shape, transform=dst.window_transform(window))
+                        data[outside] = nodata
+                else:
+                    read_tile(window, data)
 
-        except FileNotFoundError:
-            logging.error("[ERROR] File not found: %s", params["url"], exc_info=True)
-        except PermissionError:
-            logging.error("[ERROR] Permission denied when accessing raster: %s", params["url"], exc_info=True)
-        except rasterio.errors.RasterioError as e:
-            logging.error("[ERROR] Rasterio processing error: %s", e, exc_info=True)
-        except ValueError as e:
-            logging.error("[ERROR] ValueError while processing raster: %s", e, exc_info=True)
-        except Exception as e:
-            logging.error("[ERROR] Unexpected error while processing raster: %s", e, exc_info=True)
+                tile_min, tile_max, any_valid = minmax_valid(data, nodata)
+                if any_valid:
+                    actual_min = min(actual_min, float(tile_min))
+                    actual_max = max(actual_max, float(tile_max))
 
-        return 0
+                # Trapezoidal suitability scores in [0, 1] in one fused pass; NoData pixels
+                # are passed through as the sentinel
+                trapezoid_kernel(data, nodata, mn, of, ot, mx, normalized)
+                quantize(normalized, nodata, score_scale, quantized)
+                dst.write(quantized, 1, window=window)
 
+        # Ensure raster has valid data after masking/alignment
+        if actual_min > actual_max:
+            os.remove(output_path)
+            return None, None, None
 
-        
-    
+        return output_path, actual_min, actual_max
 
+    @staticmethod
+    def grid_offset(src, ref):
+        """
+        (col_off, row_off) of the reference grid inside src when src already lies on it: same CRS
+        and pixel size, pixel-aligned, and covering the whole grid. None if src has to be warped.
+        """
+        st, rt = src.transform, ref["transform"]
+        if src.crs != ref["crs"] or not np.allclose((st.a, st.b, st.d, st.e), (rt.a, rt.b, rt.d, rt.e)):
+            return None
+        col, row = ~st * (rt.c, rt.f)
+        col_off, row_off = int(round(col)), int(round(row))
+        if abs(col - col_off) > 1e-6 or abs(row - row_off) > 1e-6:
+            return None
+        if col_off < 0 or row_off < 0 or col_off + ref["width"] > src.width or row_off + ref["height"] > src.height:
+            return None
+        return col_off, row_off
 
     def set_combine_file(self, in_raster, ras_temp_path):
         """
@@ -523,37 +626,34 @@ class LandSuitability(TargetingTool):
    
 
 
-    def save_output(self, combined_raster, ras_temp_path,raster_base_path,desc):
+    def save_output(self, output_path, ras_temp_path,raster_base_path,desc, value_range=None):
         """
-        Save the combined raster as the final output.
-        """
-        output_path = os.path.join(ras_temp_path, "final_output.tif")
+        Reclassify the combined raster written by combine_rasters into the final output.
 
-        if combined_raster is None:
+        value_range is the (min, max) of the combined raster's valid pixels when known; it lets
+        reclassify skip its rule loop when every pixel lands in one class.
+        """
+        if output_path is None:
             raise ValueError("Combined raster is None. Cannot save output.")
 
-        ref_raster_path = os.path.join(ras_temp_path, "normalized_0.tif")
-        with rasterio.open(ref_raster_path) as ref_raster:
-            meta = ref_raster.meta
-            meta.update({
-                "driver": "GTiff",
-                "dtype": "float32",
-                "width": combined_raster.shape[1],
-                "height": combined_raster.shape[0],
-                "count": 1,
-            })
-            with rasterio.open(output_path, "w", **meta) as dst:
-                dst.write(combined_raster, 1)
-
         # Ensure no open references to the file before reclassifying
         logging.debug("Ensuring file is closed before reclassification: %s", output_path)
         output_reclassified_path = os.path.splitext(output_path)[0] + "_reclassified.tif"
         try:
-            reclassify(output_path, output_reclassified_path, allow_overwrite=True)  # Apply reclassification
+            reclassify(output_path, output_reclassified_path, allow_overwrite=True,
+                       value_range=value_range)  # Apply reclassification
         except Exception as e:
             logging.error("Reclassification failed: %s", e, exc_info=True)
             raise
 
+        # Overviews let previews read a downsampled copy instead of full resolution; the output
+        # holds class codes, so they are resampled by mode rather than averaged
+        with rasterio.open(output_reclassified_path, "r+") as dst:
+            factors = [f for f in OVERVIEW_FACTORS if min(dst.width, dst.height) // f > 0]
+            if factors:
+                dst.build_overviews(factors, Resampling.mode)
+                dst.update_tags(ns="rio_overview", resampling="mode")
+
         self.cleanup_intermediate_files(ras_temp_path, output_reclassified_path)
         # Compute relative path for the output
         media_dir = os.path.join(os.getcwd(), "media")
@@ -585,9 +685,10 @@ class LandSuitability(TargetingTool):
         Returns:
             shapely.geometry.Polygon: AOI transformed to raster CRS.
         """
-        transformer = Transformer.from_crs("EPSG:4326", raster_crs.to_string(), always_xy=True)
-        transformed_coords = [transformer.transform(x, y) for x, y in aoi.exterior.coords]
-        return box(*transformed_coords)
+        transformer = _transformer("EPSG:4326", raster_crs.to_string())
+        xs, ys = np.asarray(aoi.exterior.coords).T
+        xs, ys = transformer.transform(xs, ys)
+        return box(xs.min(), ys.min(), xs.max(), ys.max())
     
     def transform_aoi_to_raster_crs(self, aoi, raster_crs):
         """
@@ -599,14 +700,15 @@ class LandSuitability(TargetingTool):
         if not isinstance(aoi, (Polygon, MultiPolygon)):
             raise TypeError("AOI must be a shapely Polygon or MultiPolygon.")
 
-        transformer = Transformer.from_crs(
+        transformer = _transformer(
             "EPSG:4326",
             raster_crs.to_string() if hasattr(raster_crs, "to_string") else raster_crs,
-            always_xy=True
         )
 
-        # shapely.ops.transform will transform ALL coords (exterior + interiors, and all parts in MultiPolygon)
-        return shapely_transform(lambda x, y, z=None: transformer.transform(x, y), aoi)
+        # Transform ALL coords (exterior + interiors, and all parts in MultiPolygon)
+        if isinstance(aoi, MultiPolygon):
+            return MultiPolygon([_transform_polygon(transformer, part) for part in aoi.geoms])
+        return _transform_polygon(transformer, aoi)
 
     def get_extent_from_aoi(self, aoi_input):
         """
@@ -645,12 +747,12 @@ class LandSuitability(TargetingTool):
             raise TypeError("Unsupported AOI input type. Must be a string or dictionary.")
 
     
-    def validate_aoi_overlap(self, raster_path, aoi):
-        with rasterio.open(raster_path) as src:
-            raster_bounds = box(*src.bounds)
-            if not aoi.intersects(raster_bounds):
-                logging.warning("AOI does not overlap with raster: %s", raster_path)
-                return False
+    def validate_aoi_overlap(self, src, aoi):
+        """Check the AOI against the bounds of an already open raster."""
+        raster_bounds = box(*src.bounds)
+        if not aoi.intersects(raster_bounds):
+            logging.warning("AOI does not overlap with raster: %s", src.name)
+            return False
         return True
     
     def cleanup_intermediate_files(self, ras_temp_path, final_file_path):
@@ -663,21 +765,23 @@ class LandSuitability(TargetingTool):
         """
         final_file_path = os.path.abspath(final_file_path)
 
-        for name in os.listdir(ras_temp_path):
-            path = os.path.join(ras_temp_path, name)
-            try:
-                if os.path.abspath(path) == final_file_path:
-                    # Skip the final product
-                    continue
-
-                if os.path.isfile(path) or os.path.islink(path):
-                    os.remove(path)
-                    logging.debug("Deleted intermediate file: %s", path)
-                elif os.path.isdir(path):
-                    shutil.rmtree(path)
-                    logging.debug("Deleted intermediate directory: %s", path)
-            except Exception as e:
-                logging.warning("Could not delete %s: %s", path, e)
+        # scandir entries carry their type from the directory listing, so no per-file stat calls
+        with os.scandir(ras_temp_path) as entries:
+            for entry in entries:
+                path = entry.path
+                try:
+                    if os.path.abspath(path) == final_file_path:
+                        # Skip the final product
+                        continue
+
+                    if entry.is_dir(follow_symlinks=False):
+                        shutil.rmtree(path)
+                        logging.debug("Deleted intermediate directory: %s", path)
+                    else:
+                        os.remove(path)
+                        logging.debug("Deleted intermediate file: %s", path)
+                except Exception as e:
+                    logging.warning("Could not delete %s: %s", path, e)
     
     
     def store_metadata_in_session(self, file_metadata):
@@ -692,34 +796,26 @@ class LandSuitability(TargetingTool):
         self.session.modified = True
         logging.debug("Stored file metadata in session: %s", file_metadata)
 
-    def resample_raster(self, input_path, reference_meta, output_path):
+    def resample_raster(self, src, reference_meta):
         """
-        Resample the input raster to match the reference raster's shape and resolution.
+        Resample an open raster to match the reference raster's shape and resolution.
         Parameters:
-            input_path (str): Path to the input raster.
+            src (DatasetReader): The open input raster.
             reference_meta (dict): Metadata of the reference raster.
-            output_path (str): Path to save the resampled raster.
+        Returns:
+            WarpedVRT: Band 1 warped onto the reference grid as it is read, window by window;
+                       close it (or use it as a context manager) when done.
         """
-        with rasterio.open(input_path) as src:
-            transform = reference_meta['transform']
-            width = reference_meta['width']
-            height = reference_meta['height']
-
-            # Resample the input raster
-            data = src.read(
-                out_shape=(src.count, height, width),
-                resampling=Resampling.bilinear,  # Use bilinear resampling for continuous data
-            )
-
-            # Update metadata to match the reference
-            resampled_meta = src.meta.copy()
-            resampled_meta.update({
-                'transform': transform,
-                'width': width,
-                'height': height,
-            })
-
-            # Save the resampled raster
-            with rasterio.open(output_path, 'w', **resampled_meta) as dst:
-                dst.write(data)
-
+        # Bilinear resampling for continuous data; NoData is skipped by the warp kernel
+        return WarpedVRT(
+            src,
+            crs=reference_meta.get('crs') or src.crs,
+            transform=reference_meta['transform'],
+            width=reference_meta['width'],
+            height=reference_meta['height'],
+            src_nodata=src.nodata,
+            nodata=src.nodata,
+            resampling=Resampling.bilinear,
+            warp_mem_limit=WARP_MEM_LIMIT,
+            warp_extras={"NUM_THREADS": WARP_THREADS},
+        )
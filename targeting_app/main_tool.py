@@ -67,19 +67,31 @@ class TargetingTool:
             self.write_raster(output_path, out_image, out_meta)
 
     def combine_rasters(self, raster_paths, method='max'):
-        rasters = [rasterio.open(path) for path in raster_paths]
-        arrays = [r.read(1) for r in rasters]
-        meta = rasters[0].meta
-
-        if method == 'max':
-            combined_data = np.maximum.reduce(arrays)
-        elif method == 'min':
-            combined_data = np.minimum.reduce(arrays)
-        elif method == 'mean':
-            combined_data = np.mean(arrays, axis=0)
-        else:
+        if method not in ('max', 'min', 'mean'):
             raise ValueError("Unknown combine method: {}".format(method))
 
+        # Reduce one raster at a time into an accumulator, reusing a single read buffer,
+        # instead of stacking every input
+        with rasterio.open(raster_paths[0]) as src:
+            meta = src.meta
+            combined_data = src.read(1)
+        if method == 'mean':
+            combined_data = combined_data.astype(np.result_type(combined_data.dtype, np.float32))
+        buf = np.empty(combined_data.shape, dtype=meta['dtype'])
+
+        for path in raster_paths[1:]:
+            with rasterio.open(path) as src:
+                src.read(1, out=buf)
+            if method == 'max':
+                np.maximum(combined_data, buf, out=combined_data)
+            elif method == 'min':
+                np.minimum(combined_data, buf, out=combined_data)
+            else:
+                combined_data += buf
+
+        if method == 'mean':
+            combined_data /= len(raster_paths)
+
         output_path = os.path.join(os.path.dirname(raster_paths[0]), "combined.tif")
         self.write_raster(output_path, combined_data, meta)
         return output_path
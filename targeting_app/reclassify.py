@@ -17,19 +17,20 @@ def reclassify(input_raster_path, output_raster_path, reclassification_rules=Non
     Returns:
         str: Path to the reclassified raster.
     """
-    NO_DATA_VALUE = -32768  # Consistent NoData value
+    INPUT_NO_DATA_VALUE = -32768  # Assumed input NoData when the source declares none
+    NO_DATA_VALUE = 255  # Output NoData; classes are small integers stored as uint8
 
     if os.path.exists(output_raster_path) and not allow_overwrite:
         raise FileExistsError(f"The output file '{output_raster_path}' already exists. "
                               f"Please provide a different path or enable overwriting.")
 
-    with rasterio.open(input_raster_path,masked=True) as src:
-        data = src.read(1).astype(np.float32)  # Ensure float32 for processing
+    with rasterio.open(input_raster_path) as src:
+        data = src.read(1, out_dtype=np.float32)  # Ensure float32 for processing
         meta = src.meta.copy()
 
         # Preserve NoData values
-        nodata = src.nodata if src.nodata is not None else NO_DATA_VALUE
-        masked_data = np.ma.masked_equal(data, nodata)  # Mask NoData values
+        nodata = src.nodata if src.nodata is not None else INPUT_NO_DATA_VALUE
+        valid = data != nodata
 
         if not reclassification_rules:
             reclassification_rules = [
@@ -39,26 +40,36 @@ def reclassify(input_raster_path, output_raster_path, reclassification_rules=Non
                 (0.6, 0.8, 4),
                 (0.8, 1.0, 5)
             ]
+        mins, maxs, values = (np.array(col, dtype=np.float32) for col in zip(*reclassification_rules))
+        values = values.astype(np.uint8)
 
         # Initialize reclassified array with NoData values
-        reclassified_data = np.ma.masked_array(
-            np.full(masked_data.shape, NO_DATA_VALUE, dtype=np.float32),
-            mask=masked_data.mask  # Inherit NoData mask
-        )
-
-        # Apply reclassification rules
-        for (min_val, max_val, new_value) in reclassification_rules:
-            mask = (masked_data >= min_val) & (masked_data <= max_val) & ~masked_data.mask  # Ignore NoData
-            reclassified_data[mask] = new_value
-
-        # Convert masked array back to standard numpy array while preserving NoData
-        reclassified_data = np.ma.filled(reclassified_data, NO_DATA_VALUE)
-
-        # Update metadata (ensure correct NoData handling)
+        reclassified_data = np.full(data.shape, NO_DATA_VALUE, dtype=np.uint8)
+        vals = data[valid]
+
+        if np.all(mins <= maxs) and np.all(mins[1:] >= maxs[:-1]):
+            # Ordered rules that at most share a boundary (where the later rule wins): each
+            # value's rule is the last one whose min is <= it, found in one binary search
+            idx = np.searchsorted(mins, vals, side="right") - 1
+            np.clip(idx, 0, len(mins) - 1, out=idx)
+            hit = (vals >= mins[idx]) & (vals <= maxs[idx])
+            reclassified_data[valid] = np.where(hit, values[idx], np.uint8(NO_DATA_VALUE))
+        else:
+            # Apply reclassification rules; later rules take precedence where they overlap
+            classes = np.full(vals.shape, NO_DATA_VALUE, dtype=np.uint8)
+            for (min_val, max_val, new_value) in reclassification_rules:
+                classes[(vals >= min_val) & (vals <= max_val)] = new_value
+            reclassified_data[valid] = classes
+
+        # Update metadata (ensure correct NoData handling); byte-wise horizontal differencing
+        # plus fast DEFLATE suits the long runs of a categorical raster
         meta.update({
             "count": 1,
-            "dtype": "float32",
-            "nodata": NO_DATA_VALUE  # Explicit NoData assignment
+            "dtype": "uint8",
+            "nodata": NO_DATA_VALUE,  # Explicit NoData assignment
+            "compress": "DEFLATE",
+            "predictor": 2,
+            "zlevel": 1
         })
 
         # Save reclassified raster
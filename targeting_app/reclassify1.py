@@ -5,6 +5,8 @@ from collections import OrderedDict
 import os
 from typing import List, Tuple, Optional, Union
 
+from ._kernels import classify
+
 
 DEFAULT_RULES: List[Tuple[float, float, int]] = [
     (0.0, 0.2, 1),
@@ -48,6 +50,18 @@ def _rules_are_valid(rules: List[Tuple[float, float, int]]) -> None:
             )
 
 
+def _single_class(
+    rules: List[Tuple[float, float, int]], value_range: Tuple[float, float]
+) -> Optional[int]:
+    """Class of every value in value_range if the whole range falls in one rule, else None."""
+    lo, hi = value_range
+    for i, (mn, mx, new_value) in enumerate(rules):
+        is_last = (i == len(rules) - 1)
+        if lo >= mn and (hi <= mx if is_last else hi < mx):
+            return new_value
+    return None
+
+
 def reclassify(
     input_raster_path: str,
     output_raster_path: str,
@@ -58,11 +72,15 @@ def reclassify(
     compress: bool = True,
     tiled: bool = True,
     tile_size: int = 512,
+    value_range: Optional[Tuple[float, float]] = None,
 ) -> str:
     """
     Reclassifies an input raster (typically a 0..1 suitability raster) into classes (e.g., 1..5),
     preserving NoData pixels.
 
+    value_range is the (min, max) of the valid input pixels when the caller already knows it;
+    if it falls inside a single rule, every valid pixel gets that class without the rule loop.
+
     NOTE: This function only changes the *reclassified* output file.
     The original continuous suitability raster remains unchanged for other analyses.
     """
@@ -77,32 +95,25 @@ def reclassify(
 
     out_dtype = _normalize_dtype(output_dtype)
     nodata_out = _default_nodata_for_dtype(out_dtype) if output_nodata is None else output_nodata
+    single_value = _single_class(rules, value_range) if value_range is not None else None
+
+    # Rule bounds and classes as lookup arrays for the one-pass classify kernel
+    rule_mins = np.array([r[0] for r in rules], dtype=np.float64)
+    rule_maxs = np.array([r[1] for r in rules], dtype=np.float64)
+    lut = np.array([r[2] for r in rules], dtype=out_dtype)
 
     with rasterio.open(input_raster_path) as src:
-        data = src.read(1, masked=True)
-        masked_data = np.ma.masked_invalid(data)
         meta = src.meta.copy()
-
-        out = np.full(masked_data.shape, nodata_out, dtype=out_dtype)
-        valid = ~masked_data.mask
-        vals = masked_data.data
-
-        for i, (mn, mx, new_value) in enumerate(rules):
-            is_last = (i == len(rules) - 1)
-            if is_last:
-                m = valid & (vals >= mn) & (vals <= mx)
-            else:
-                m = valid & (vals >= mn) & (vals < mx)
-            out[m] = np.array(new_value, dtype=out_dtype)
-
         meta.update({"count": 1, "dtype": str(out_dtype), "nodata": nodata_out})
 
         driver = meta.get("driver", "GTiff")
         if driver.lower() in ("gtiff", "cog"):
             if compress:
                 meta["compress"] = "DEFLATE"
-                meta["predictor"] = 2 if np.issubdtype(out_dtype, np.floating) else 1
-                meta["zlevel"] = 6
+                # Horizontal differencing for every dtype; level 1 keeps DEFLATE off the critical
+                # path at a negligible size cost for categorical output
+                meta["predictor"] = 2
+                meta["zlevel"] = 1
             if tiled:
                 meta["tiled"] = True
                 meta["blockxsize"] = int(tile_size)
@@ -110,7 +121,24 @@ def reclassify(
             meta["bigtiff"] = "IF_SAFER"
 
         with rasterio.open(output_raster_path, "w", **meta) as dst:
-            dst.write(out, 1)
+            # Block by block in the output's own layout, so each write fills exactly one block
+            for _, window in dst.block_windows(1):
+                data = src.read(1, window=window, masked=True)
+                valid = ~np.ma.getmaskarray(data)
+                vals = data.data
+                out = np.empty(vals.shape, dtype=out_dtype)
+
+                if single_value is not None:
+                    out.fill(nodata_out)
+                    out[valid & (vals == vals)] = np.array(single_value, dtype=out_dtype)  # NaN is invalid too
+                else:
+                    # Compare in the data's float precision, as the per-rule scalar comparisons did;
+                    # values in gaps or outside all rules stay NoData
+                    edge_dtype = vals.dtype if np.issubdtype(vals.dtype, np.floating) else np.float64
+                    classify(vals, valid, rule_mins.astype(edge_dtype), rule_maxs.astype(edge_dtype),
+                             lut, nodata_out, out)
+
+                dst.write(out, 1, window=window)
 
     return output_raster_path
 
@@ -143,33 +171,31 @@ def rescale_to_0_1(input_raster_path: str, output_raster_path: str, allow_overwr
         )
 
     with rasterio.open(input_raster_path) as src:
-        data = src.read(1, masked=True)
-        data = np.ma.masked_invalid(data)
         meta = src.meta.copy()
-
-        valid = ~data.mask
-        if not np.any(valid):
-            nod = src.nodata if src.nodata is not None else -32768
-            out = np.full(data.shape, nod, dtype=np.float32)
-            meta.update(count=1, dtype="float32", nodata=nod)
-            with rasterio.open(output_raster_path, "w", **meta) as dst:
-                dst.write(out, 1)
-            return output_raster_path
-
-        vals = data.data[valid].astype(np.float32)
-        mn = float(vals.min())
-        mx = float(vals.max())
-
         nod = src.nodata if src.nodata is not None else -32768
-        out = np.full(data.shape, nod, dtype=np.float32)
+        meta.update(count=1, dtype="float32", nodata=nod)
 
-        if np.isclose(mx, mn):
-            out[valid] = 0.0
-        else:
-            out[valid] = (data.data[valid].astype(np.float32) - mn) / (mx - mn)
+        # First pass: min/max of the valid pixels, one block at a time
+        mn, mx = np.inf, -np.inf
+        for _, window in src.block_windows(1):
+            data = np.ma.masked_invalid(src.read(1, window=window, masked=True))
+            vals = data.compressed().astype(np.float32)
+            if vals.size:
+                mn = min(mn, float(vals.min()))
+                mx = max(mx, float(vals.max()))
 
-        meta.update(count=1, dtype="float32", nodata=nod)
+        # Second pass: scale each block; an all-NoData raster is written as NoData
         with rasterio.open(output_raster_path, "w", **meta) as dst:
-            dst.write(out, 1)
+            for _, window in dst.block_windows(1):
+                data = np.ma.masked_invalid(src.read(1, window=window, masked=True))
+                valid = ~np.ma.getmaskarray(data)
+                out = np.full(data.shape, nod, dtype=np.float32)
+
+                if np.isclose(mx, mn):
+                    out[valid] = 0.0
+                elif mn < mx:
+                    out[valid] = (data.data[valid].astype(np.float32) - mn) / (mx - mn)
+
+                dst.write(out, 1, window=window)
 
     return output_raster_path
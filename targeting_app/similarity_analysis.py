@@ -1,17 +1,27 @@
 import os
 import numpy as np
 import pandas as pd
-from scipy.spatial.distance import mahalanobis
-from scipy.stats import zscore
+from concurrent.futures import ThreadPoolExecutor
+from scipy.linalg import solve_triangular
 import rasterio
 
-def read_raster(raster_path):
-    """Read raster data and metadata using rasterio, and handle NoData values."""
+def read_raster(raster_path, out=None):
+    """Read raster data and metadata using rasterio, and handle NoData values.
+
+    If out (a float array of the raster's shape) is given, the band is read into it in place.
+    """
     with rasterio.open(raster_path) as src:
-        raster_data = src.read(1)  # Read the first band
         transform = src.transform
         nodata = src.nodata
 
+        if out is not None:
+            raster_data = src.read(1, out=out)
+            if nodata is not None:
+                np.putmask(raster_data, raster_data == nodata, np.nan)
+            return raster_data, transform, nodata
+
+        raster_data = src.read(1)  # Read the first band
+
         # If NoData is a specific value, replace it with np.nan
         if nodata is not None:
             raster_data = np.where(raster_data == nodata, np.nan, raster_data)
@@ -38,15 +48,29 @@ def write_raster(raster_data, output_path, transform, nodata):
 def calculate_mahalanobis(threshold, idx, total_files, out_folder, df, raster_shape, transform, nodata):
     """Calculate Mahalanobis distance and save as a raster."""
     mean_vec = threshold.iloc[:, idx:idx + total_files].mean().values
-    df_clean = df[~np.isnan(df).any(axis=1)]  # Remove rows with NaN values for covariance calculation
+    valid = ~np.isnan(df).any(axis=1)
+    df_clean = df[valid]  # Remove rows with NaN values for covariance calculation
 
     if df_clean.shape[0] > 1:
         cov_matrix = np.cov(df_clean, rowvar=False)
     else:
         cov_matrix = np.eye(df_clean.shape[1])  # Fallback to identity matrix
 
-    inv_cov_matrix = np.linalg.pinv(cov_matrix)
-    mahal_dist = np.array([mahalanobis(row, mean_vec, inv_cov_matrix) for row in df])
+    # Calculate Mahalanobis distance, sqrt(d @ inv_cov @ d), for every valid row at once;
+    # rows with NaN stay NaN
+    mahal_dist = np.full(df.shape[0], np.nan, dtype=np.float32)
+    d = df_clean - mean_vec.astype(np.float32)
+    try:
+        # With cov = L L^T the distance is |L^-1 d|: one triangular solve for all rows, k
+        # multiplies per pixel for the squared norm instead of k^2 for the quadratic form
+        chol = np.linalg.cholesky(cov_matrix).astype(np.float32)
+        y = solve_triangular(chol, d.T, lower=True, overwrite_b=True, check_finite=False)
+        q = np.einsum('ij,ij->j', y, y)
+    except np.linalg.LinAlgError:
+        # Singular covariance: fall back to the pseudo-inverse
+        inv_cov_matrix = np.linalg.pinv(cov_matrix)
+        q = np.einsum('ij,jk,ik->i', d, inv_cov_matrix.astype(np.float32), d, optimize=True)
+    mahal_dist[valid] = np.sqrt(np.maximum(q, 0))  # Rounding can push q just below 0 near the mean
 
     # Reshape the result back to the raster shape
     mahal_raster = mahal_dist.reshape(raster_shape)
@@ -58,12 +82,14 @@ def calculate_mahalanobis(threshold, idx, total_files, out_folder, df, raster_sh
 def calculate_mess(df, total_files, threshold, idx, raster_shape, transform, nodata, out_folder):
     """Calculate MESS and save as a raster."""
     bool_na = ~np.isnan(df).any(axis=1)
-    mess_result = np.full(df.shape[0], np.nan)
+    mess_result = np.full(df.shape[0], np.nan, dtype=np.float32)
 
-    for i in range(df.shape[0]):
-        if bool_na[i]:
-            z = zscore(df[i, :])
-            mess_result[i] = min(z)
+    # Row-wise z-scores (population std, as scipy's zscore) of every valid row at once;
+    # a constant row gives NaN, as before
+    rows = df[bool_na]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = (rows - rows.mean(axis=1, keepdims=True)) / rows.std(axis=1, keepdims=True)
+    mess_result[bool_na] = z.min(axis=1)
 
     # Reshape the result back to the raster shape
     mess_raster = mess_result.reshape(raster_shape)
@@ -74,32 +100,31 @@ def calculate_mess(df, total_files, threshold, idx, raster_shape, transform, nod
 
 def similarity_analysis(total_files, work_space, file_paths):
     """Main function to perform similarity analysis (Mahalanobis and MESS) on raster data."""
-    df = pd.DataFrame()
-    raster_shape = None
-    transform = None
-    nodata = None
-
     # Read the threshold CSV (assuming this contains the required data for calculations)
     threshold = pd.read_csv(os.path.join(work_space, "temp.csv"))
 
-    # Iterate over the actual raster file paths
-    for i, file_path in enumerate(file_paths, start=1):
-        raster_data, transform, nodata = read_raster(file_path)
-        
-        if i == 1:
-            raster_shape = raster_data.shape
-            df = pd.DataFrame(raster_data.flatten())  # Flatten the raster into 1D array
-        else:
-            df = pd.concat([df, pd.DataFrame(raster_data.flatten())], axis=1)
+    # One float32 column per raster, allocated once from the first raster's header;
+    # column-major so each column is contiguous
+    with rasterio.open(file_paths[0]) as src:
+        raster_shape = src.shape
+    stack = np.empty((raster_shape[0] * raster_shape[1], len(file_paths)), dtype=np.float32, order='F')
+
+    # Read the rasters concurrently, each straight into its column; GDAL releases the GIL while
+    # reading and decoding
+    def load(i):
+        return read_raster(file_paths[i], out=stack[:, i].reshape(raster_shape))
+
+    with ThreadPoolExecutor() as executor:
+        _, transform, nodata = list(executor.map(load, range(len(file_paths))))[-1]
 
     # Calculate Mahalanobis distance and save it as a GeoTIFF raster
     try:
-        calculate_mahalanobis(threshold, 0, total_files, work_space, df.values, raster_shape, transform, nodata)
+        calculate_mahalanobis(threshold, 0, total_files, work_space, stack, raster_shape, transform, nodata)
     except Exception as e:
         print(f"Error in calculate_mahalanobis: {e}")
 
     # Calculate MESS and save it as a GeoTIFF raster
     try:
-        calculate_mess(df.values, total_files, threshold, 0, raster_shape, transform, nodata, work_space)
+        calculate_mess(stack, total_files, threshold, 0, raster_shape, transform, nodata, work_space)
     except Exception as e:
         print(f"Error in calculate_mess: {e}")
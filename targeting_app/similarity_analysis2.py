@@ -1,20 +1,20 @@
 import os
 import numpy as np
 import pandas as pd
-from scipy.spatial.distance import mahalanobis
-from scipy.stats import zscore
+from concurrent.futures import ThreadPoolExecutor
+from scipy.linalg import solve_triangular
 import rasterio
 from rasterio.warp import calculate_default_transform, reproject, Resampling
 from rasterio.transform import xy
 
-def read_raster(raster_path):
+def read_raster(raster_path, out=None):
     """
     Read raster data and metadata using rasterio.
     Replace NoData values with NaN for computation.
+    If out (a float array of the raster's shape) is given, the band is read into it in place.
     """
     try:
         with rasterio.open(raster_path) as src:
-            raster_data = src.read(1)  # Read the first band
             transform = src.transform
             nodata = src.nodata
 
@@ -22,8 +22,14 @@ def read_raster(raster_path):
             print(f"CRS: {src.crs}, Bounds: {src.bounds}, Resolution: {src.res}, NoData: {nodata}")
 
             # Replace NoData values with NaN
-            if nodata is not None:
-                raster_data = np.where(raster_data == nodata, np.nan, raster_data)
+            if out is not None:
+                raster_data = src.read(1, out=out)
+                if nodata is not None:
+                    np.putmask(raster_data, raster_data == nodata, np.nan)
+            else:
+                raster_data = src.read(1)  # Read the first band
+                if nodata is not None:
+                    raster_data = np.where(raster_data == nodata, np.nan, raster_data)
 
             valid_data_count = np.count_nonzero(~np.isnan(raster_data))
             print(f"Valid data count: {valid_data_count}")
@@ -98,17 +104,27 @@ def calculate_mahalanobis(threshold, total_files, out_folder, df, raster_shape,
     try:
         print("Calculating Mahalanobis distance...")
         mean_vec = threshold.iloc[:, :total_files].mean().values
-        df_clean = df[~np.isnan(df).any(axis=1)]  # Remove rows with NaN for covariance
+        valid = ~np.isnan(df).any(axis=1)
+        df_clean = df[valid]  # Remove rows with NaN for covariance
 
         # Fallback to identity matrix if covariance calculation fails
         cov_matrix = np.cov(df_clean, rowvar=False) if df_clean.shape[0] > 1 else np.eye(df_clean.shape[1])
-        inv_cov_matrix = np.linalg.pinv(cov_matrix)
 
-        # Calculate Mahalanobis distance
-        mahal_dist = np.array([
-            mahalanobis(row, mean_vec, inv_cov_matrix) if not np.any(np.isnan(row)) else np.nan
-            for row in df
-        ])
+        # Calculate Mahalanobis distance, sqrt(d @ inv_cov @ d), for every valid row at once;
+        # rows with NaN stay NaN
+        mahal_dist = np.full(df.shape[0], np.nan, dtype=np.float32)
+        d = df_clean - mean_vec.astype(np.float32)
+        try:
+            # With cov = L L^T the distance is |L^-1 d|: one triangular solve for all rows, k
+            # multiplies per pixel for the squared norm instead of k^2 for the quadratic form
+            chol = np.linalg.cholesky(cov_matrix).astype(np.float32)
+            y = solve_triangular(chol, d.T, lower=True, overwrite_b=True, check_finite=False)
+            q = np.einsum('ij,ij->j', y, y)
+        except np.linalg.LinAlgError:
+            # Singular covariance: fall back to the pseudo-inverse
+            inv_cov_matrix = np.linalg.pinv(cov_matrix)
+            q = np.einsum('ij,jk,ik->i', d, inv_cov_matrix.astype(np.float32), d, optimize=True)
+        mahal_dist[valid] = np.sqrt(np.maximum(q, 0))  # Rounding can push q just below 0 near the mean
 
         # Reshape and save as raster
         mahal_raster = mahal_dist.reshape(raster_shape)
@@ -124,12 +140,15 @@ def calculate_mess(df, total_files, threshold, raster_shape, transform, nodata,
     """
     try:
         print("Calculating MESS...")
-        mess_result = np.full(df.shape[0], np.nan)
+        bool_na = ~np.isnan(df).any(axis=1)
+        mess_result = np.full(df.shape[0], np.nan, dtype=np.float32)
 
-        for i, row in enumerate(df):
-            if not np.any(np.isnan(row)):
-                z = zscore(row)
-                mess_result[i] = np.min(z)
+        # Row-wise z-scores (population std, as scipy's zscore) of every valid row at once;
+        # a constant row gives NaN, as before
+        rows = df[bool_na]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            z = (rows - rows.mean(axis=1, keepdims=True)) / rows.std(axis=1, keepdims=True)
+        mess_result[bool_na] = z.min(axis=1)
 
         # Reshape and save as raster
         mess_raster = mess_result.reshape(raster_shape)
@@ -145,9 +164,6 @@ def similarity_analysis(total_files, work_space, file_paths):
     """
     try:
         print("Starting similarity analysis...")
-        df = pd.DataFrame()
-        raster_shape, transform, nodata, input_crs = None, None, None, None
-
         # Read the threshold CSV
         threshold_csv_path = os.path.join(work_space, "temp.csv")
         if not os.path.exists(threshold_csv_path):
@@ -156,23 +172,27 @@ def similarity_analysis(total_files, work_space, file_paths):
         threshold = pd.read_csv(threshold_csv_path)
         print(f"Threshold CSV loaded from {threshold_csv_path}")
 
-        # Read and flatten raster files
-        for i, file_path in enumerate(file_paths, start=1):
-            raster_data, transform, nodata, input_crs = read_raster(file_path)
+        # One float32 column per raster, allocated once from the first raster's header;
+        # column-major so each column is contiguous
+        with rasterio.open(file_paths[0]) as src:
+            raster_shape = src.shape
+        stack = np.empty((raster_shape[0] * raster_shape[1], len(file_paths)), dtype=np.float32, order='F')
 
-            if i == 1:
-                raster_shape = raster_data.shape
-                df = pd.DataFrame(raster_data.flatten())
-            else:
-                df = pd.concat([df, pd.DataFrame(raster_data.flatten())], axis=1)
+        # Read the rasters concurrently, each straight into its column; GDAL releases the GIL
+        # while reading and decoding
+        def load(i):
+            return read_raster(file_paths[i], out=stack[:, i].reshape(raster_shape))
+
+        with ThreadPoolExecutor() as executor:
+            _, transform, nodata, input_crs = list(executor.map(load, range(len(file_paths))))[-1]
 
-        print(f"Raster data successfully loaded. DataFrame shape: {df.shape}")
+        print(f"Raster data successfully loaded. Stack shape: {stack.shape}")
 
         # Mahalanobis Distance Calculation
-        calculate_mahalanobis(threshold, total_files, work_space, df.values, raster_shape, transform, nodata, input_crs)
+        calculate_mahalanobis(threshold, total_files, work_space, stack, raster_shape, transform, nodata, input_crs)
 
         # MESS Calculation
-        calculate_mess(df.values, total_files, threshold, raster_shape, transform, nodata, work_space, input_crs)
+        calculate_mess(stack, total_files, threshold, raster_shape, transform, nodata, work_space, input_crs)
 
         print("Similarity analysis completed successfully.")
     except Exception as e:
@@ -191,7 +191,8 @@ def reclassify_to_quantiles(raster_array: np.ndarray, num_classes: int = 5) -> n
     NaNs preserved → encoded as 0 in the output (uint8).
     """
     flat = raster_array.reshape(-1)
-    valid = flat[~np.isnan(flat)]
+    nan_mask = np.isnan(flat)
+    valid = flat[~nan_mask]
 
     if valid.size == 0:
         # All NaNs → return zeros
@@ -203,7 +204,7 @@ def reclassify_to_quantiles(raster_array: np.ndarray, num_classes: int = 5) -> n
     if np.allclose(np.nanmin(valid), np.nanmax(valid)):
         # All values equal → put all to middle class
         cls = np.full_like(raster_array, fill_value=(num_classes + 1) // 2, dtype=np.uint8)
-        cls[np.isnan(raster_array)] = 0
+        cls[nan_mask.reshape(raster_array.shape)] = 0
         return cls
 
     qs = np.quantile(valid, q=np.linspace(0, 1, num_classes + 1))
@@ -212,13 +213,12 @@ def reclassify_to_quantiles(raster_array: np.ndarray, num_classes: int = 5) -> n
         if qs[i] <= qs[i - 1]:
             qs[i] = np.nextafter(qs[i - 1], np.inf)
 
-    # Digitize valid values
-    out_flat = np.full(flat.shape, np.nan, dtype=np.float32)
-    out_flat[~np.isnan(flat)] = np.digitize(valid, qs[1:], right=True) + 1  # 1..num_classes
+    # Bucket valid values against the interior edges in one searchsorted pass,
+    # writing classes straight into the uint8 output (NaN cells stay 0)
+    out_flat = np.zeros(flat.shape, dtype=np.uint8)
+    out_flat[~nan_mask] = np.searchsorted(qs[1:-1], valid, side="left") + 1  # 1..num_classes
 
-    out = out_flat.reshape(raster_array.shape)
-    out_u8 = np.where(np.isnan(out), 0, out).astype(np.uint8)
-    return out_u8
+    return out_flat.reshape(raster_array.shape)
 
 
 # -----------------------------
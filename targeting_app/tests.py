@@ -1,3 +1,153 @@
-from django.test import TestCase
+import os
+import tempfile
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+import rasterio
+from django.test import SimpleTestCase, override_settings
+from rasterio.transform import from_origin
+
+from . import _kernels, land_statistics
+from .land_statistics import LandStatistics
+
+
+class ZonalStatsPathsTest(SimpleTestCase):
+    """
+    The exactextract and fallback zonal stats paths disagree by design; these
+    pin down how, on a 4x4 raster with one nodata pixel under a polygon that
+    covers row 0 fully and row 1 by 40%.
+    """
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        data = np.arange(1, 17, dtype=np.float32).reshape(4, 4)
+        data[0, 0] = -9999
+        with rasterio.open(
+            os.path.join(self.media.name, "mess.tif"), "w", driver="GTiff", height=4, width=4, count=1,
+            dtype="float32", crs="EPSG:4326", transform=from_origin(0, 4, 1, 1), nodata=-9999,
+        ) as dst:
+            dst.write(data, 1)
+
+        self.boundaries = {
+            "type": "FeatureCollection",
+            "features": [{
+                "type": "Feature",
+                "properties": {"id": "z1"},
+                "geometry": {
+                    "type": "Polygon",
+                    "coordinates": [[[0, 2.6], [2, 2.6], [2, 4], [0, 4], [0, 2.6]]],
+                },
+            }],
+        }
+
+    def _stats(self):
+        with override_settings(MEDIA_ROOT=self.media.name):
+            tool = LandStatistics(self.boundaries, "/media/mess.tif", "MESS raster file", "id")
+            return tool.compute_statistics()[0]
+
+    def test_fallback_counts_pixel_centres_and_only_nan_as_nodata(self):
+        with mock.patch.object(land_statistics, "exact_extract", None):
+            stats = self._stats()
+        # Only the row 0 centres fall inside; the -9999 nodata pixel counts as data
+        self.assertEqual(stats["count"], 2)
+        self.assertEqual(stats["min"], -9999.0)
+        self.assertEqual(stats["max"], 2.0)
+        self.assertAlmostEqual(stats["mean"], -4998.5)
+
+    @skipUnless(land_statistics.exact_extract is not None, "exactextract is not installed")
+    def test_exactextract_weights_coverage_and_honours_nodata(self):
+        stats = self._stats()
+        # Weights: pixel (0, 1) = 2 fully, (1, 0) = 5 and (1, 1) = 6 at 0.4; nodata dropped
+        self.assertEqual(stats["count"], 2)  # round(1.8)
+        self.assertEqual(stats["min"], 2.0)
+        self.assertEqual(stats["max"], 6.0)
+        self.assertAlmostEqual(stats["mean"], (2 + 0.4 * 5 + 0.4 * 6) / 1.8, places=4)
+
+
+@skipUnless(_kernels.njit is not None, "numba is not installed; only the NumPy versions exist")
+class KernelFallbackTest(SimpleTestCase):
+    """
+    Each numba kernel in _kernels must agree with the NumPy version used when numba
+    is missing, including on NaN, nodata and rule-boundary values.
+    """
+
+    NODATA = np.float32(-32768)
+
+    def setUp(self):
+        self.data = np.array(
+            [[-1.0, 0.0, 0.5, 1.0, 1.5],
+             [2.0, 2.5, 3.0, 4.0, np.nan],
+             [-32768, 0.2, 0.4, 0.6, 0.8]],
+            dtype=np.float32,
+        )
+
+    def _both(self, name, *args, out_like=None):
+        """Run kernel name and its fallback on fresh copies of args; returns both results."""
+        fast = getattr(_kernels, name)
+        slow = getattr(_kernels, f"_{name.removesuffix('_kernel')}_numpy")
+        results = []
+        for fn in (fast, slow):
+            call = [a.copy() if isinstance(a, np.ndarray) else a for a in args]
+            if out_like is not None:
+                call.append(np.empty_like(out_like))
+            results.append(fn(*call))
+        return results
+
+    def test_suitability_kernel(self):
+        for params in ((0, 1, 2, 3), (1, 1, 2, 3), (0, 1, 2, 2)):
+            params = [np.float32(p) for p in params]
+            fast, slow = self._both("suitability_kernel", self.data, *params, out_like=self.data)
+            np.testing.assert_allclose(fast, slow, rtol=1e-6, equal_nan=True)
+
+    def test_trapezoid_kernel(self):
+        for params in ((0, 1, 2, 3), (1, 1, 2, 3), (0, 1, 2, 2)):
+            params = [np.float32(p) for p in params]
+            fast, slow = self._both("trapezoid_kernel", self.data, self.NODATA, *params, out_like=self.data)
+            np.testing.assert_allclose(fast, slow, rtol=1e-6)
+
+    def test_classify(self):
+        vals = np.array([[-0.1, 0.0, 0.2, 0.4, 0.6], [0.8, 0.99, 1.0, 1.1, np.nan]], dtype=np.float32)
+        valid = np.ones(vals.shape, dtype=np.bool_)
+        valid[0, 1] = False
+        mins = np.array([0, 0.2, 0.4, 0.6, 0.8], dtype=np.float32)
+        maxs = np.array([0.2, 0.4, 0.6, 0.8, 1.0], dtype=np.float32)
+        lut = np.arange(1, 6, dtype=np.uint8)
+        out = np.empty(vals.shape, dtype=np.uint8)
+        fast, slow = self._both("classify", vals, valid, mins, maxs, lut, 255, out_like=out)
+        np.testing.assert_array_equal(fast, slow)
+        np.testing.assert_array_equal(fast, [[255, 255, 2, 3, 4], [5, 5, 5, 255, 255]])
+
+    def test_quantize_rounds_half_up(self):
+        data = np.array([[0.0, 0.00005, 0.00015, 0.49995], [1.0, -0.00005, -0.00015, -32768]],
+                        dtype=np.float32)
+        out = np.empty(data.shape, dtype=np.int16)
+        fast, slow = self._both("quantize", data, self.NODATA, np.float32(10000), out_like=out)
+        np.testing.assert_array_equal(fast, slow)
+
+    def test_dequantize(self):
+        data = np.array([[0, 1, 10000], [-32768, 5000, 9999]], dtype=np.float32)
+        fast, slow = self._both("dequantize", data, self.NODATA, np.float32(1e-4))
+        np.testing.assert_allclose(fast, slow, rtol=1e-6)
+
+    def test_minmax_valid_skips_nodata_and_nan(self):
+        self.assertEqual(*self._both("minmax_valid", self.data, self.NODATA))
+        empty = np.array([[np.nan, -32768]], dtype=np.float32)
+        fast, slow = self._both("minmax_valid", empty, self.NODATA)
+        self.assertFalse(fast[2])
+        self.assertFalse(slow[2])
+
+    def test_masked_maximum_and_multiply(self):
+        acc = np.array([[0.5, -32768, 0.2, np.nan], [1.0, 0.3, np.nan, 0.0]], dtype=np.float32)
+        data = np.array([[0.1, 0.4, -32768, 0.6], [2.0, np.nan, np.nan, 0.0]], dtype=np.float32)
+        for name in ("masked_maximum", "masked_multiply"):
+            fast, slow = self._both(name, acc, data, self.NODATA)
+            np.testing.assert_allclose(fast, slow, equal_nan=True, err_msg=name)
+
+    def test_add_log_and_exp_mean(self):
+        data = np.array([[0.0, 1e-40, 0.5, 1.0], [2.0, np.nan, 0.25, 1e-3]], dtype=np.float32)
+        acc = np.zeros(data.shape, dtype=np.float32)
+        fast, slow = self._both("add_log", data, acc)
+        np.testing.assert_allclose(fast, slow, rtol=1e-5, equal_nan=True)
+        fast, slow = self._both("exp_mean", fast, np.float32(0.5), out_like=data)
+        np.testing.assert_allclose(fast, slow, rtol=1e-5, equal_nan=True)